@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse
+from sklearn.linear_model import SGDClassifier
+from sklearn.model_selection import KFold
+from sklearn.preprocessing import normalize
+
+from streaming_training import RANDOM_STATE, make_hashing_vectorizer
+
+# --- Active-Learning Scrape Prioritization ---
+# Every product document is hashed once into a fixed-width sparse row (no vocabulary
+# to fit), so a quick SGD model can be retrained on the labels scraped so far in
+# seconds. Each round, the products not yet scraped are ranked by how unsure that
+# model is about them (prediction margin or entropy), plus a bonus for the
+# categories that are still short of an even share of the labels, which is the
+# skew diagnostic_script.analyze_data_balance reports. Only the top of that ranking
+# is scraped. The loop stops once the quick model's cross-validated accuracy
+# has reached the target in ROUNDS_AT_TARGET consecutive rounds (so at least one
+# round of hard products has been tested, not just the seed), or the budget of
+# labeled products is spent.
+SEED_PRODUCTS = 500
+ROUND_PRODUCTS = 250
+TARGET_ACCURACY = 0.97
+ROUNDS_AT_TARGET = 2
+UNCERTAINTY_MEASURES = ['margin', 'entropy']
+SHORTFALL_WEIGHT = 0.5
+QUICK_MODEL_ALPHA = 1e-4
+CV_FOLDS = 5
+# Same minimum as the step 3 trainers
+MIN_TRAINING_ROWS = 50
+
+class DocumentHasher:
+    """
+    Sums hashed term counts per ProductId over chunks of reviews (or of whole product
+    documents), so every product gets one row however its reviews are spread over chunks.
+
+    Every candidate has to be rescored each round, so the feature matrix of the whole
+    corpus is kept: about 8 bytes per distinct (product, hashed term) pair, far less than
+    the text itself. Chunks keep their own per-product rows, and the rows of products
+    that span chunks are summed once in result(). While that runs, memory peaks at
+    roughly twice the matrix. With the product document store every product is in
+    one batch and there is nothing to sum.
+    """
+
+    def __init__(self, vectorizer=None):
+        self.vectorizer = vectorizer or make_hashing_vectorizer(norm=None)
+        self.positions = {}
+        self.parts = []
+
+    def consume(self, chunks):
+        """Passes ProductId/CleanedText chunks through, hashing each one on the way."""
+        for chunk in chunks:
+            self.add(chunk['ProductId'], chunk['CleanedText'])
+            yield chunk
+
+    def add(self, product_ids, texts):
+        present = product_ids.notna().to_numpy()
+        codes, uniques = pd.factorize(product_ids[present])
+        counts = self.vectorizer.transform(texts[present].fillna('').astype(str))
+        rows = np.array([self.positions.setdefault(pid, len(self.positions)) for pid in uniques], dtype=np.int64)
+        # One row per review -> one row per product in this chunk
+        to_products = scipy.sparse.csr_matrix(
+            (np.ones(len(codes), dtype=np.float32), (codes, np.arange(len(codes)))),
+            shape=(len(uniques), len(codes)),
+        )
+        self.parts.append((rows, (to_products @ counts).tocsr()))
+
+    def result(self):
+        """(ProductIds, L2-normalised feature matrix with one row per product, in the same order)."""
+        product_ids = np.array(list(self.positions), dtype=object)
+        if not self.parts:
+            return product_ids, scipy.sparse.csr_matrix((0, self.vectorizer.n_features), dtype=np.float32)
+        rows = np.concatenate([part_rows for part_rows, _ in self.parts])
+        stacked = scipy.sparse.vstack([matrix for _, matrix in self.parts], format='csr')
+        self.parts = []
+        if len(rows) == len(product_ids) and (rows == np.arange(len(rows))).all():
+            # Every product came in one chunk, in order of first appearance
+            counts = stacked
+        else:
+            to_products = scipy.sparse.csr_matrix(
+                (np.ones(len(rows), dtype=np.float32), (rows, np.arange(len(rows)))),
+                shape=(len(product_ids), len(rows)),
+            )
+            counts = to_products @ stacked
+        del stacked
+        return product_ids, normalize(counts, copy=False)
+
+def fit_quick_model(features, labels):
+    model = SGDClassifier(loss='log_loss', alpha=QUICK_MODEL_ALPHA, class_weight='balanced',
+                          max_iter=50, tol=1e-3, random_state=RANDOM_STATE)
+    return model.fit(features, labels)
+
+def trainable(labels):
+    """Mask of the labels usable for training: categorized, in a category with at least two rows."""
+    labels = pd.Series(labels)
+    counts = labels.value_counts()
+    return (labels != 'Uncategorized').to_numpy() & labels.map(counts).ge(2).to_numpy()
+
+def cross_validated_accuracy(features, labels, folds=CV_FOLDS):
+    """
+    Accuracy of the quick model over `folds` shuffled folds of the labeled products.
+    Later rounds add the hardest products, so this tends to understate the final accuracy.
+    """
+    labels = np.asarray(labels, dtype=object)
+    predictions = np.empty(len(labels), dtype=object)
+    for train, test in KFold(min(folds, len(labels)), shuffle=True, random_state=RANDOM_STATE).split(labels):
+        if len(np.unique(labels[train])) < 2:
+            predictions[test] = labels[train][0]
+            continue
+        predictions[test] = fit_quick_model(features[train], labels[train]).predict(features[test])
+    return float((predictions == labels).mean())
+
+def uncertainty(probabilities, measure='margin'):
+    """Per-row uncertainty in [0, 1]: 1 minus the gap between the top two classes, or normalised entropy."""
+    if measure not in UNCERTAINTY_MEASURES:
+        raise ValueError(f"Unknown uncertainty measure '{measure}'. Expected one of {UNCERTAINTY_MEASURES}.")
+    if measure == 'margin':
+        top_two = np.sort(probabilities, axis=1)[:, -2:]
+        return 1 - (top_two[:, 1] - top_two[:, 0])
+    entropy = -(probabilities * np.log(np.clip(probabilities, 1e-12, None))).sum(axis=1)
+    return entropy / np.log(probabilities.shape[1])
+
+def category_shortfall(labels, classes):
+    """Per class, how far its label count falls short of an even share (0 = at or above it, 1 = none)."""
+    counts = pd.Series(labels).value_counts().reindex(classes).fillna(0).to_numpy()
+    even_share = counts.sum() / len(classes)
+    return np.clip(1 - counts / even_share, 0, 1)
+
+def priority_scores(model, features, labels, measure='margin', shortfall_weight=SHORTFALL_WEIGHT):
+    """Uncertainty plus the probability-weighted shortfall of the categories a product is likely to be in."""
+    probabilities = model.predict_proba(features)
+    return uncertainty(probabilities, measure) + shortfall_weight * probabilities @ category_shortfall(labels, model.classes_)
+
+def select_next(scores, count):
+    """Positions of the `count` highest scores, best first."""
+    if count >= len(scores):
+        return np.argsort(-scores, kind='stable')
+    top = np.argpartition(-scores, count - 1)[:count]
+    return top[np.argsort(-scores[top], kind='stable')]
@@ -0,0 +1,128 @@
+import pandas as pd
+import html
+import sys
+import time
+import argparse
+
+from data_io import iter_table
+from step_1_elt import INPUT_FILE_PATH, COLUMN_TO_CLEAN, clean_html, fast_strip_html, soup_strip_html
+
+# --- Configuration ---
+DEFAULT_SAMPLE_SIZE = 20000
+
+# --- Equivalence Corpus ---
+# Hand-picked edge cases for the fast path. Every entry must clean to exactly what
+# BeautifulSoup's get_text(separator=' ', strip=True) returns.
+EQUIVALENCE_CORPUS = [
+    "",
+    "   ",
+    "Plain review with no markup at all.",
+    "Great product!<br /><br />Would buy again.",
+    "Great product!<br><BR/>Would buy again.",
+    "  leading and trailing whitespace <br />  ",
+    "<p>Paragraph one</p><p>Paragraph two</p>",
+    'See <a href="http://www.amazon.com/gp/product/B000E7L2R4">this one</a> instead.',
+    "<a href=http://www.amazon.com/dp/B001/>unquoted link</a>",
+    "<span class='x'>nested <b>bold <i>italic</i></b></span>",
+    "Tabs\tand\nnewlines<br />\r\nsurvive inside nodes",
+    "Non-breaking\xa0space <br />\xa0<br /> only node",
+    "Price was $5 &amp; worth it<br />",
+    "M&amp;M's in a bag",
+    "&lt;b&gt;double escaped&lt;/b&gt;",
+    "Entity &copy; and &#39;quotes&#39;",
+    "a < b and c > d",
+    "Broken <b tag",
+    "<!-- comment --> after comment",
+    "<script>var x = 1;</script>visible",
+    "<unknown>custom tag</unknown>",
+    "<p =x>odd attribute</p>",
+    "<a href='x>y'>quoted angle bracket</a>",
+    "Path-like text /usr/bin and C:\\temp",
+    "Caf\u00e9 cr\u00e8me <br/> br\u00fbl\u00e9e",
+    "<br>x</br>word",
+    "<br>\u00e9\r\n</br>>>",
+    "Line one</br>line two",
+    "Rule<hr>below</hr>text",
+    "<img src='x.jpg'>caption</img>after",
+]
+
+def reference_clean_html(html_text):
+    """The cleaner before the fast path was added; the ground truth for equivalence."""
+    if not isinstance(html_text, str):
+        return ""
+    text = html.unescape(html_text)
+    if ('/' in text or '\\' in text) and '<' not in text:
+        return text
+    return soup_strip_html(text)
+
+def tier_of(html_text):
+    """Names the tier clean_html uses for a value."""
+    if not isinstance(html_text, str):
+        return 'non-string'
+    text = html.unescape(html_text)
+    if ('/' in text or '\\' in text) and '<' not in text:
+        return 'passthrough'
+    if fast_strip_html(text) is not None:
+        return 'fast-path'
+    return 'beautifulsoup'
+
+def check_equivalence(texts):
+    mismatches = []
+    for text in texts:
+        expected = reference_clean_html(text)
+        actual = clean_html(text)
+        if actual != expected:
+            mismatches.append((text, expected, actual))
+    return mismatches
+
+def rows_per_second(func, texts):
+    start = time.perf_counter()
+    for text in texts:
+        func(text)
+    elapsed = time.perf_counter() - start
+    return len(texts) / elapsed if elapsed > 0 else float('inf')
+
+def main(sample_size):
+    texts = list(EQUIVALENCE_CORPUS)
+    try:
+        df = next(iter_table(INPUT_FILE_PATH, columns=[COLUMN_TO_CLEAN], chunksize=sample_size), pd.DataFrame(columns=[COLUMN_TO_CLEAN]))
+        texts.extend(df[COLUMN_TO_CLEAN].tolist())
+        print(f"Loaded {len(df):,} rows from '{INPUT_FILE_PATH}' plus {len(EQUIVALENCE_CORPUS)} corpus cases.")
+    except FileNotFoundError:
+        print(f"'{INPUT_FILE_PATH}' not found. Using the built-in corpus only ({len(texts)} cases).")
+
+    # 1. Equivalence
+    print("\n--- Equivalence Check ---")
+    mismatches = check_equivalence(texts)
+    if mismatches:
+        print(f"❌ {len(mismatches)} value(s) differ from the BeautifulSoup reference:")
+        for text, expected, actual in mismatches[:10]:
+            print(f"  input={text!r}\n    expected={expected!r}\n    actual=  {actual!r}")
+        sys.exit(1)
+    print(f"✅ All {len(texts):,} values are byte-identical to the BeautifulSoup reference.")
+
+    # 2. Throughput per tier
+    print("\n--- Throughput (rows/sec) ---")
+    tiers = {}
+    for text in texts:
+        tiers.setdefault(tier_of(text), []).append(text)
+    for tier, tier_texts in sorted(tiers.items()):
+        print(f"  {tier:<14} {len(tier_texts):>8,} rows  {rows_per_second(clean_html, tier_texts):>12,.0f} rows/sec")
+
+    reference_rate = rows_per_second(reference_clean_html, texts)
+    tiered_rate = rows_per_second(clean_html, texts)
+    print(f"\n  {'reference':<14} {len(texts):>8,} rows  {reference_rate:>12,.0f} rows/sec")
+    print(f"  {'tiered':<14} {len(texts):>8,} rows  {tiered_rate:>12,.0f} rows/sec")
+    print(f"  Speedup: {tiered_rate / reference_rate:.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify and benchmark the tiered HTML cleaner.")
+    parser.add_argument(
+        '--sample_size',
+        type=int,
+        default=DEFAULT_SAMPLE_SIZE,
+        help='Number of rows to read from the raw reviews file.'
+    )
+    args = parser.parse_args()
+
+    main(args.sample_size)
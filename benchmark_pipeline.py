@@ -0,0 +1,235 @@
+import argparse
+import importlib.util
+import io
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+from data_io import iter_table, read_table
+from generate_synthetic_data import SIZES, DEFAULT_OUTPUT_ROOT, REVIEWS_FILE_NAME, generate
+
+# ==============================================================================
+# Pipeline Benchmark Suite
+# ==============================================================================
+# Times every pipeline stage on synthetic data at one or more scales, fully
+# offline, and compares the timings against a stored baseline.
+#
+#   python3 benchmark_pipeline.py --sizes 10k 100k --save-baseline   # record
+#   python3 benchmark_pipeline.py --sizes 10k 100k                   # compare
+#
+# Each scale runs inside <data-root>/<rows>/, so the steps read and write
+# their usual ./client_files paths there and never touch the client data.
+# ==============================================================================
+
+# --- Configuration ---
+DEFAULT_SIZES = ['10k', '100k']
+DEFAULT_BASELINE_FILE = './benchmark_baseline.json'
+DEFAULT_TOLERANCE = 0.25            # Slower than baseline by more than this fraction is a regression
+MIN_COMPARABLE_SECONDS = 0.05       # Shorter timings are too noisy to compare
+CLEAN_HTML_SAMPLE_ROWS = 50000
+MAX_IN_MEMORY_ANALYSIS_ROWS = 1_000_000   # analyze_dataset loads the whole file
+
+def load_step(file_name, module_name):
+    """Imports a step script by path (some file names are not valid module names)."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), file_name)
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    # Registered so worker processes can unpickle references to its functions
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+step_0 = load_step('step_0_data_discovery.py', 'step_0_data_discovery')
+step_1 = load_step('step_1_elt.py', 'step_1_elt')
+step_2 = load_step('step_2_webscraping_labelled_training_data.py', 'step_2_webscraping_labelled_training_data')
+step_2_5 = load_step('step_2.5_training_parameter_tuning_optional.py', 'step_2_5_training_parameter_tuning_optional')
+step_3 = load_step('step_3_NLP_data_classification_arg.py', 'step_3_NLP_data_classification_arg')
+
+# --- Benchmarks ---
+# Each takes the shared state dict and returns the number of rows it processed.
+# They run in this order; later ones use the outputs of earlier ones.
+def bench_clean_html(state):
+    texts = next(iter_table(step_1.INPUT_FILE_PATH, columns=[step_1.COLUMN_TO_CLEAN], chunksize=CLEAN_HTML_SAMPLE_ROWS))
+    texts = texts[step_1.COLUMN_TO_CLEAN].tolist()
+    start = time.perf_counter()
+    for text in texts:
+        step_1.clean_html(text)
+    state['clean_html_seconds'] = time.perf_counter() - start
+    return len(texts)
+
+def bench_step_1(state):
+    step_1.main(workers=state['workers'], build_store=True)
+    return state['rows']
+
+def bench_analyze_dataset(state):
+    if state['rows'] > MAX_IN_MEMORY_ANALYSIS_ROWS:
+        return None
+    return step_0.analyze_dataset(step_1.INPUT_FILE_PATH)
+
+def bench_analyze_dataset_streaming(state):
+    return step_0.analyze_dataset_streaming(step_1.INPUT_FILE_PATH)
+
+def bench_create_targeted_list(state):
+    return len(step_2.create_targeted_list())
+
+def bench_tune_hyperparameters(state):
+    step_2_5.tune_hyperparameters(results_file=os.path.join('client_files', 'tuning_results.json'))
+    return len(read_table(step_2_5.LABELED_CATEGORIES_FILE, columns=['Category']))
+
+def bench_train_model(state):
+    state['tfidf'], state['model'], metadata = step_3.train_model(5000)
+    return metadata['training_rows']
+
+def bench_predict_all_products(state):
+    return step_3.predict_all_products(state['tfidf'], state['model'], True, state['workers'])
+
+BENCHMARKS = [
+    ('clean_html', bench_clean_html),
+    ('step_1_elt', bench_step_1),
+    ('analyze_dataset', bench_analyze_dataset),
+    ('analyze_dataset_streaming', bench_analyze_dataset_streaming),
+    ('create_targeted_list', bench_create_targeted_list),
+    ('tune_hyperparameters', bench_tune_hyperparameters),
+    ('train_model', bench_train_model),
+    ('predict_all_products', bench_predict_all_products),
+]
+
+def run_scale(size_name, data_root, workers, verbose=False):
+    """Runs every benchmark on one scale, generating its data first if needed."""
+    rows = SIZES[size_name]
+    scale_dir = os.path.abspath(os.path.join(data_root, str(rows)))
+    data_dir = os.path.join(scale_dir, 'client_files')
+    if not os.path.exists(os.path.join(data_dir, REVIEWS_FILE_NAME)):
+        print(f"Generating {rows:,} synthetic reviews in '{data_dir}'...")
+        generate(rows, data_dir)
+
+    state = {'rows': rows, 'workers': workers}
+    results = {}
+    original_dir = os.getcwd()
+    os.chdir(scale_dir)
+    try:
+        for name, benchmark in BENCHMARKS:
+            output = sys.stdout if verbose else io.StringIO()
+            start = time.perf_counter()
+            try:
+                with redirect_stdout(output):
+                    processed = benchmark(state)
+            except (Exception, SystemExit) as e:
+                results[name] = {'error': f"{type(e).__name__}: {e}"}
+                print(f"  ❌ {name:<28} failed: {results[name]['error']}")
+                continue
+            seconds = state.pop('clean_html_seconds', None) or time.perf_counter() - start
+            if processed is None:
+                print(f"  ⏩ {name:<28} skipped at this scale")
+                continue
+            results[name] = {
+                'seconds': round(seconds, 4),
+                'rows': processed,
+                'rows_per_second': round(processed / seconds, 1) if seconds > 0 else None,
+            }
+            print(f"  {name:<31} {seconds:>9.2f}s  {results[name]['rows_per_second'] or 0:>12,.0f} rows/s")
+    finally:
+        os.chdir(original_dir)
+    return results
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Prints current vs baseline timings. Returns the list of regressions."""
+    regressions = []
+    print(f"\n--- Comparison with Baseline ({baseline.get('created_at', 'unknown date')}) ---")
+    print(f"{'scale':<8} {'benchmark':<28} {'baseline':>10} {'current':>10} {'change':>8}")
+    for size_name, benchmarks in results.items():
+        for name, current in benchmarks.items():
+            previous = baseline['results'].get(size_name, {}).get(name)
+            if not previous or 'seconds' not in previous or 'seconds' not in current:
+                continue
+            change = current['seconds'] / previous['seconds'] - 1 if previous['seconds'] > 0 else 0.0
+            flag = ''
+            if change > tolerance and previous['seconds'] >= MIN_COMPARABLE_SECONDS:
+                flag = '  ❌ regression'
+                regressions.append((size_name, name, change))
+            print(f"{size_name:<8} {name:<28} {previous['seconds']:>9.2f}s {current['seconds']:>9.2f}s {change:>+8.0%}{flag}")
+    return regressions
+
+def main(sizes, data_root, workers, baseline_file, save_baseline, tolerance, verbose):
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'workers': workers,
+        'results': {},
+    }
+    for size_name in sizes:
+        print(f"\n--- Benchmarking {SIZES[size_name]:,} rows ({size_name}) ---")
+        report['results'][size_name] = run_scale(size_name, data_root, workers, verbose)
+
+    results_dir = os.path.join(data_root, 'results')
+    os.makedirs(results_dir, exist_ok=True)
+    results_path = os.path.join(results_dir, f"benchmark_{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(results_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to: {results_path}")
+
+    if save_baseline:
+        with open(baseline_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Baseline saved to: {baseline_file}")
+        return
+
+    if not os.path.exists(baseline_file):
+        print(f"No baseline at '{baseline_file}'. Run again with --save-baseline to record one.")
+        return
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+    regressions = compare_to_baseline(report['results'], baseline, tolerance)
+    if regressions:
+        print(f"\n❌ {len(regressions)} benchmark(s) are more than {tolerance:.0%} slower than the baseline.")
+        sys.exit(1)
+    print(f"\n✅ No benchmark is more than {tolerance:.0%} slower than the baseline.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic data.")
+    parser.add_argument(
+        '--sizes',
+        nargs='+',
+        choices=list(SIZES),
+        default=DEFAULT_SIZES,
+        help='Scales to benchmark. Data for each is generated on first use.'
+    )
+    parser.add_argument(
+        '--data-root',
+        default=DEFAULT_OUTPUT_ROOT,
+        help='Where synthetic data and benchmark results are kept.'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='Worker processes for step 1 cleaning and step 3 prediction.'
+    )
+    parser.add_argument(
+        '--baseline',
+        default=DEFAULT_BASELINE_FILE,
+        help='Baseline results to compare against.'
+    )
+    parser.add_argument(
+        '--save-baseline',
+        action='store_true',
+        help='Store this run as the new baseline instead of comparing.'
+    )
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help='Allowed slowdown before a benchmark counts as a regression (0.25 = 25%%).'
+    )
+    parser.add_argument(
+        '--verbose',
+        action='store_true',
+        help="Show the steps' own output."
+    )
+    args = parser.parse_args()
+
+    main(args.sizes, args.data_root, args.workers, args.baseline, args.save_baseline, args.tolerance, args.verbose)
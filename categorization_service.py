@@ -0,0 +1,272 @@
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from pipeline_metrics import LATENCY_PERCENTILES, StageMetrics, add_profile_argument
+from step_1_elt import clean_html
+from step_3_NLP_data_classification_arg import load_artifacts
+
+# ==============================================================================
+# Local Categorization Service
+#
+# Loads the saved step 3 model once and answers category requests over HTTP:
+#   python3 categorization_service.py --port 8100 [--model <artifact dir>]
+#
+#   POST /predict   {"ProductId": "B001", "text": "<review text>", "top_k": 3}
+#                   a JSON array of such objects, or JSON Lines (answered line by line)
+#   GET  /stats     request, batch and latency counters
+#   GET  /health
+#
+# "text" may also be a list of review texts; they are joined into one product
+# document, as in step 3. Requests arriving together are combined into one
+# micro-batch, so a single sparse transform + predict_proba serves all of them.
+# ==============================================================================
+
+# --- Configuration ---
+DEFAULT_PORT = 8100
+DEFAULT_TOP_K = 3
+MAX_BATCH_SIZE = 64
+# How long the batcher waits for more requests once it has one. Requests that
+# queue up while a batch is being predicted join the next batch anyway, so by
+# default nothing waits: under load batches grow, when idle latency stays minimal.
+MAX_BATCH_WAIT_SECONDS = 0.0
+# Pending connections; the socketserver default of 5 makes bursts of new
+# keep-alive clients wait for a SYN retry (about a second).
+LISTEN_BACKLOG = 128
+# Server-side latencies kept for the percentiles in /stats
+LATENCY_WINDOW = 100000
+
+class MicroBatcher:
+    """Collects queued items into batches for one transform + predict_proba call each."""
+
+    def __init__(self, tfidf, model, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_BATCH_WAIT_SECONDS):
+        self.tfidf = tfidf
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self.thread.start()
+
+    def submit(self, document):
+        """Queues one product document. Returns a Future of its class probabilities."""
+        future = Future()
+        self.queue.put((document, future))
+        return future
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                probabilities = self.model.predict_proba(self.tfidf.transform([document for document, _ in batch]))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            with self.lock:
+                self.batches += 1
+                self.items += len(batch)
+            for (_, future), row in zip(batch, probabilities):
+                future.set_result(row)
+
+class ServiceStats:
+    """Thread-safe request counters and a window of recent latencies."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, seconds):
+        with self.lock:
+            self.requests += 1
+            self.latencies.append(seconds)
+
+    def record_error(self):
+        with self.lock:
+            self.errors += 1
+
+    def snapshot(self, batcher):
+        with self.lock:
+            latencies_ms = np.array(self.latencies, dtype=float) * 1000
+            requests, errors = self.requests, self.errors
+        with batcher.lock:
+            batches, items = batcher.batches, batcher.items
+        uptime = time.perf_counter() - self.started
+        stats = {
+            'uptime_seconds': round(uptime, 1),
+            'requests': requests,
+            'errors': errors,
+            'items': items,
+            'batches': batches,
+            'mean_batch_size': round(items / batches, 2) if batches else None,
+            'items_per_second': round(items / uptime, 1) if uptime > 0 else None,
+        }
+        if len(latencies_ms):
+            for p, value in zip(LATENCY_PERCENTILES, np.percentile(latencies_ms, LATENCY_PERCENTILES)):
+                stats[f"p{p}_ms"] = round(float(value), 2)
+            stats['max_ms'] = round(float(latencies_ms.max()), 2)
+        return stats
+
+def parse_items(body, content_type):
+    """
+    Returns (request items, response format). A JSON object is answered with an object, a JSON
+    array with an array, and JSON Lines (or an x-ndjson body) with one result line per item.
+    """
+    if 'ndjson' not in content_type:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = None
+        if isinstance(payload, dict):
+            return [payload], 'object'
+        if isinstance(payload, list):
+            return payload, 'array'
+    return [json.loads(line) for line in body.splitlines() if line.strip()], 'jsonl'
+
+def product_document(item):
+    """The cleaned document for one request item: its review text(s), HTML stripped and joined."""
+    text = item.get('text', '')
+    texts = text if isinstance(text, list) else [text]
+    return ' '.join(cleaned for cleaned in (clean_html(t) for t in texts) if cleaned)
+
+def parse_top_k(value):
+    k = int(value)
+    if k < 1:
+        raise ValueError(f"top_k must be at least 1, got {k}")
+    return k
+
+def top_categories(classes, probabilities, k):
+    top = np.argsort(probabilities)[::-1][:k]
+    return [{'category': str(classes[i]), 'probability': round(float(probabilities[i]), 4)} for i in top]
+
+class CategorizationHandler(BaseHTTPRequestHandler):
+    # Keep-alive connections, and no Nagle delay between the header and body writes
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    batcher = None
+    stats = None
+    classes = None
+    model_version = None
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/health':
+            self._send_json({'status': 'ok', 'model_version': self.model_version})
+        elif path == '/stats':
+            self._send_json(self.stats.snapshot(self.batcher))
+        else:
+            self._send_json({'error': f"Unknown path '{path}'"}, 404)
+
+    def do_POST(self):
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        if url.path != '/predict':
+            self._send_json({'error': f"Unknown path '{url.path}'"}, 404)
+            return
+        try:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+            items, response_format = parse_items(body, self.headers.get('Content-Type', ''))
+            default_k = parse_top_k(parse_qs(url.query).get('top_k', [DEFAULT_TOP_K])[0])
+            top_ks = [parse_top_k(item.get('top_k', default_k)) for item in items]
+            # Every item is queued before waiting on any, so a batch request shares micro-batches
+            futures = [self.batcher.submit(product_document(item)) for item in items]
+            results = [
+                {'ProductId': item.get('ProductId'), 'categories': top_categories(self.classes, future.result(), k)}
+                for item, future, k in zip(items, futures, top_ks)
+            ]
+        except (ValueError, TypeError, AttributeError, UnicodeDecodeError) as e:
+            self.stats.record_error()
+            self._send_json({'error': f"Bad request: {e}"}, 400)
+            return
+        if response_format == 'jsonl':
+            self._send(''.join(json.dumps(result) + '\n' for result in results), 'application/x-ndjson')
+        else:
+            self._send_json(results[0] if response_format == 'object' else results)
+        self.stats.record(time.perf_counter() - start)
+
+    def _send_json(self, payload, status=200):
+        self._send(json.dumps(payload), 'application/json', status)
+
+    def _send(self, text, content_type, status=200):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class CategorizationServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = LISTEN_BACKLOG
+
+def main(port, model_path, max_batch_size, max_wait_ms, profile=False):
+    tfidf, model, metadata, artifact_dir = load_artifacts(model_path)
+    print(f"Loaded model {metadata.get('version')} from: {artifact_dir}")
+
+    CategorizationHandler.batcher = MicroBatcher(tfidf, model, max_batch_size, max_wait_ms / 1000)
+    CategorizationHandler.stats = ServiceStats()
+    CategorizationHandler.classes = model.classes_
+    CategorizationHandler.model_version = metadata.get('version')
+    server = CategorizationServer(('127.0.0.1', port), CategorizationHandler)
+    print(f"Categorization service listening on http://127.0.0.1:{port}/predict (stats at /stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        stats = CategorizationHandler.stats
+        metrics = StageMetrics('categorization_service', profile)
+        metrics.latencies('request_latency', list(stats.latencies))
+        metrics.finish(rows_in=stats.requests)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve category predictions from the saved step 3 model over local HTTP.")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on.')
+    parser.add_argument('--model', default=None, help='Model artifact directory. Defaults to the latest trained model.')
+    parser.add_argument('--max-batch-size', type=int, default=MAX_BATCH_SIZE, help='Most requests predicted in one call.')
+    parser.add_argument(
+        '--max-wait-ms',
+        type=float,
+        default=MAX_BATCH_WAIT_SECONDS * 1000,
+        help='How long a batch waits for more requests after its first one.'
+    )
+    add_profile_argument(parser)
+    args = parser.parse_args()
+
+    main(args.port, args.model, args.max_batch_size, args.max_wait_ms, args.profile)
@@ -0,0 +1,136 @@
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# --- Content Deduplication ---
+# The review dump repeats many texts verbatim (the same review posted on every
+# variant of a product), so the documents of variant products repeat too.
+# Values are keyed by a 64-bit hash of their content; each distinct key is
+# computed once per batch and remembered across batches in a bounded LRU cache.
+# The number of distinct keys, for the duplicate rate, is estimated with a
+# HyperLogLog sketch of fixed size (2**DISTINCT_SKETCH_PRECISION one-byte registers,
+# about 0.2% error); with --profile the keys are kept and counted exactly.
+DISTINCT_SKETCH_PRECISION = 18
+
+def content_keys(values):
+    """64-bit content hash per value of a Series."""
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+class LRUCache:
+    """Bounded key -> value map that evicts the least recently used entry."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Returns the cached value (marking it recently used), or None."""
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+def apply_once_per_content(values, compute, cache):
+    """
+    Runs `compute` (list of values -> list of results) on one copy of each distinct value
+    that is not already in `cache`, and fans the results back out to every row.
+    Returns (results aligned with `values`, the distinct keys of the batch, number computed).
+    """
+    codes, unique_keys = pd.factorize(content_keys(values))
+    # Codes are numbered in order of first appearance, so these line up with unique_keys
+    first_rows = np.unique(codes, return_index=True)[1]
+    results = np.empty(len(unique_keys), dtype=object)
+    missing = []
+    for position, key in enumerate(unique_keys.tolist()):
+        cached = cache.get(key)
+        if cached is None:
+            missing.append(position)
+        else:
+            results[position] = cached
+    if missing:
+        computed = compute(values.iloc[first_rows[missing]].tolist())
+        for position, result in zip(missing, computed):
+            results[position] = result
+            cache.put(unique_keys[position].item(), result)
+    return results[codes], unique_keys, len(missing)
+
+class HyperLogLog:
+    """HyperLogLog distinct-count sketch with 2**precision registers."""
+
+    def __init__(self, precision=DISTINCT_SKETCH_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+
+    def update(self, series):
+        if series.empty:
+            return
+        self.update_hashes(pd.util.hash_pandas_object(series, index=False).to_numpy(dtype=np.uint64))
+
+    def update_hashes(self, hashes):
+        """Adds values that are already 64-bit hashes, such as content keys."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if len(hashes) == 0:
+            return
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        rest = (hashes << np.uint64(self.precision)).astype(np.float64)
+        # Rank = position of the leftmost 1-bit in the remaining bits.
+        width = 64 - self.precision
+        with np.errstate(divide='ignore'):
+            leading_zeros = np.where(rest > 0, 63 - np.floor(np.log2(rest)), width)
+        ranks = np.minimum(leading_zeros + 1, width + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, ranks)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(2.0 ** -self.registers.astype(np.float64))
+        empty = np.count_nonzero(self.registers == 0)
+        if raw <= 2.5 * m and empty:
+            return int(round(m * np.log(m / empty)))
+        return int(round(raw))
+
+class DuplicateStats:
+    """
+    Counts rows, distinct contents across all batches and how many values were actually computed.
+    Distinct contents are estimated in bounded memory, or counted exactly (memory grows with
+    the distinct keys) when `exact` is set.
+    """
+
+    def __init__(self, exact=False):
+        self.rows = 0
+        self.computed = 0
+        self.exact = exact
+        self.batch_keys = []
+        self.sketch = None if exact else HyperLogLog()
+
+    def add(self, unique_keys, rows, computed):
+        self.rows += rows
+        self.computed += computed
+        if self.exact:
+            self.batch_keys.append(np.asarray(unique_keys, dtype=np.uint64))
+        else:
+            self.sketch.update_hashes(unique_keys)
+
+    @property
+    def distinct(self):
+        if not self.exact:
+            return min(self.sketch.estimate(), self.rows)
+        return len(np.unique(np.concatenate(self.batch_keys))) if self.batch_keys else 0
+
+    def summary(self, noun):
+        """One line on the duplicate rate and the work it saved."""
+        distinct = self.distinct
+        duplicates = self.rows - distinct
+        rate = duplicates / self.rows if self.rows else 0.0
+        approx = "" if self.exact else "~"
+        return (f"{approx}{duplicates:,} of {self.rows:,} {noun} ({approx}{rate:.1%}) duplicate an earlier one; "
+                f"{self.computed:,} computed, {self.rows - self.computed:,} reused.")
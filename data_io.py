@@ -0,0 +1,230 @@
+import os
+import pandas as pd
+
+# --- Shared Table I/O for the Pipeline Steps ---
+# Intermediate tables are addressed by their CSV path. When a Parquet file with the
+# same name sits next to it (and is at least as new), readers use that instead.
+OUTPUT_FORMATS = ['csv', 'parquet']
+
+# --- Declared Schemas ---
+# Column dtypes of the pipeline's tables, keyed by file name. Whole-table reads use
+# them as given; chunked reads load 'category' columns as plain strings, because every
+# chunk would otherwise carry its own, incompatible set of categories.
+# Input contract: Id must be a number on every row (delta runs key on it). The other
+# numeric columns are nullable ('Int*'), so a blank field is read as missing; a value
+# that is not a number at all still aborts the read. Files without a declared schema
+# are parsed by pandas, which infers types from the whole file.
+REVIEW_COLUMNS = {
+    'Id': 'int32',
+    'ProductId': 'category',
+    'UserId': 'category',
+    'ProfileName': 'str',
+    'HelpfulnessNumerator': 'Int32',
+    'HelpfulnessDenominator': 'Int32',
+    'Score': 'Int8',
+    'Time': 'Int64',
+    'Summary': 'str',
+}
+TABLE_SCHEMAS = {
+    'Reviews.csv': {**REVIEW_COLUMNS, 'Text': 'str'},
+    'Cleaned_Reviews.csv': {**REVIEW_COLUMNS, 'CleanedText': 'str'},
+    'product_categories_standardized.csv': {'ProductId': 'str', 'Category': 'category', 'CleanedText': 'str'},
+}
+# Bytes pyarrow parses per block; chunks are re-sliced to the requested row count.
+CSV_BLOCK_SIZE = 16 * 1024 * 1024
+
+def parquet_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.parquet'
+
+def output_path(csv_path, output_format):
+    return parquet_path(csv_path) if output_format == 'parquet' else csv_path
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet mode needs the 'pyarrow' package. Install it with: pip install pyarrow")
+    return pyarrow
+
+def resolve_table_path(csv_path):
+    """Returns the Parquet sibling of csv_path if it exists and is not older than the CSV."""
+    pq_path = parquet_path(csv_path)
+    if not os.path.exists(pq_path):
+        return csv_path
+    if os.path.exists(csv_path) and os.path.getmtime(csv_path) > os.path.getmtime(pq_path):
+        return csv_path
+    return pq_path
+
+def table_schema(csv_path, columns=None, chunked=False):
+    """Declared dtypes of a table's (projected) columns, or None for a file without a schema."""
+    schema = TABLE_SCHEMAS.get(os.path.basename(csv_path))
+    if schema is None:
+        return None
+    if columns is not None:
+        schema = {col: dtype for col, dtype in schema.items() if col in columns}
+    if chunked:
+        schema = {col: 'str' if dtype == 'category' else dtype for col, dtype in schema.items()}
+    return schema
+
+def _apply_schema(df, schema):
+    """Casts the declared non-string columns of a pyarrow read; strings already arrive as strings."""
+    casts = {col: dtype for col, dtype in (schema or {}).items() if dtype != 'str' and col in df.columns}
+    return df.astype(casts) if casts else df
+
+def _arrow_type(pa, dtype):
+    if dtype == 'category':
+        return pa.dictionary(pa.int32(), pa.string())
+    return pa.string() if dtype == 'str' else pa.from_numpy_dtype(dtype.lower())
+
+def _to_pandas(pa, table, schema):
+    """Arrow integers come back as nullable pandas integers (not float64 when a field was blank), then the schema is applied."""
+    nullable_ints = {pa.int8(): pd.Int8Dtype(), pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype()}
+    return _apply_schema(table.to_pandas(types_mapper=nullable_ints.get), schema)
+
+def _open_arrow_csv(pa, path, columns, schema, malformed_rows):
+    """
+    A streaming pyarrow CSV reader. Quoted fields may span lines. Rows with the wrong
+    number of fields are skipped and appended to `malformed_rows` instead of aborting
+    the whole read, which is what used to force pandas' slow python engine.
+    """
+    import pyarrow.csv
+
+    def skip_malformed(row):
+        malformed_rows.append(row.number)
+        return 'skip'
+
+    column_types = {col: _arrow_type(pa, dtype) for col, dtype in (schema or {}).items()}
+    return pa.csv.open_csv(
+        path,
+        read_options=pa.csv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+        parse_options=pa.csv.ParseOptions(newlines_in_values=True, invalid_row_handler=skip_malformed),
+        # Empty strings are missing values, as they are for pandas
+        convert_options=pa.csv.ConvertOptions(include_columns=columns, column_types=column_types, strings_can_be_null=True),
+    )
+
+def _report_malformed(path, malformed_rows):
+    if malformed_rows:
+        # pyarrow cannot always tell the line number of a row
+        first = next((number for number in malformed_rows if number is not None), None)
+        where = f" (first at line {first})" if first is not None else ""
+        print(f"⚠️ Skipped {len(malformed_rows):,} malformed row(s) in '{path}'{where}.")
+
+def _iter_arrow_csv(path, columns, chunksize, schema):
+    """Yields a CSV file parsed by pyarrow as DataFrame chunks of exactly `chunksize` rows (the last may be shorter)."""
+    pa = _require_pyarrow()
+    malformed_rows = []
+    pending, pending_rows = [], 0
+    for batch in _open_arrow_csv(pa, path, columns, schema, malformed_rows):
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= chunksize:
+            table = pa.Table.from_batches(pending)
+            yield _to_pandas(pa, table.slice(0, chunksize), schema)
+            rest = table.slice(chunksize)
+            pending, pending_rows = rest.to_batches(), rest.num_rows
+    if pending_rows:
+        yield _to_pandas(pa, pa.Table.from_batches(pending), schema)
+    _report_malformed(path, malformed_rows)
+
+def _has_pyarrow():
+    try:
+        _require_pyarrow()
+    except ImportError:
+        return False
+    return True
+
+def read_table(csv_path, columns=None):
+    """
+    Reads an intermediate table, projecting to `columns` when given.
+    Parquet files are memory-mapped and only the requested column chunks are decoded.
+    CSV files with a declared schema are parsed by pyarrow when it is installed; any other
+    CSV is left to pandas, since pyarrow would infer its column types from the first block only.
+    """
+    path = resolve_table_path(csv_path)
+    schema = table_schema(csv_path, columns)
+    if path.endswith('.parquet'):
+        _require_pyarrow()
+        df = pd.read_parquet(path, columns=columns, engine='pyarrow', memory_map=True)
+        return _apply_schema(df, schema)
+    if schema is not None and _has_pyarrow():
+        pa = _require_pyarrow()
+        malformed_rows = []
+        df = _to_pandas(pa, _open_arrow_csv(pa, path, columns, schema, malformed_rows).read_all(), schema)
+        _report_malformed(path, malformed_rows)
+        return df
+    return pd.read_csv(path, usecols=columns, dtype=schema)
+
+def iter_table(csv_path, columns=None, chunksize=100000):
+    """Yields an intermediate table as DataFrame chunks of at most `chunksize` rows."""
+    path = resolve_table_path(csv_path)
+    schema = table_schema(csv_path, columns, chunked=True)
+    if path.endswith('.parquet'):
+        pa = _require_pyarrow()
+        parquet_file = pa.parquet.ParquetFile(path, memory_map=True)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield _apply_schema(batch.to_pandas(), schema)
+        return
+    if schema is not None and _has_pyarrow():
+        yield from _iter_arrow_csv(path, columns, chunksize, schema)
+        return
+    with pd.read_csv(path, usecols=columns, dtype=schema, chunksize=chunksize) as reader:
+        yield from reader
+
+def write_table(df, csv_path, output_format='csv'):
+    """Writes a whole table in one go and returns the path written."""
+    with TableWriter(csv_path, output_format) as writer:
+        writer.write(df)
+    return writer.path
+
+class TableWriter:
+    """
+    Appends DataFrame chunks to a CSV or Parquet file.
+    In Parquet mode every chunk becomes one row group, so nothing is held back in memory.
+    """
+
+    def __init__(self, csv_path, output_format='csv'):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}'. Expected one of {OUTPUT_FORMATS}.")
+        self.output_format = output_format
+        self.path = output_path(csv_path, output_format)
+        self._parquet_writer = None
+        self._schema = None
+        self._is_first_chunk = True
+
+    def write(self, chunk):
+        if self.output_format == 'parquet':
+            self._write_parquet(chunk)
+        elif self._is_first_chunk:
+            chunk.to_csv(self.path, index=False, mode='w')
+        else:
+            chunk.to_csv(self.path, index=False, mode='a', header=False)
+        self._is_first_chunk = False
+
+    def _write_parquet(self, chunk):
+        pa = _require_pyarrow()
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if self._parquet_writer is None:
+            # A column that is entirely empty in the first chunk is inferred as the null type,
+            # which no later chunk could be cast to, so such columns are fixed as strings.
+            self._schema = pa.schema(
+                [field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in table.schema],
+                metadata=table.schema.metadata,
+            )
+            table = table.cast(self._schema)
+            self._parquet_writer = pa.parquet.ParquetWriter(self.path, self._schema)
+        elif table.schema != self._schema:
+            # A chunk where a text column is entirely empty infers a different type.
+            table = table.cast(self._schema)
+        self._parquet_writer.write_table(table)
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
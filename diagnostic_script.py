@@ -1,6 +1,7 @@
-import pandas as pd
 import sys
 
+from data_io import read_table
+
 # --- Configuration ---
 LABELED_DATA_FILE = './client_files/product_categories_standardized.csv'
 
@@ -11,7 +12,7 @@ def analyze_data_balance():
     """
     print("--- Analyzing Training Data Balance ---")
     try:
-        df = pd.read_csv(LABELED_DATA_FILE)
+        df = read_table(LABELED_DATA_FILE, columns=['Category'])
         
         # Filter out the 'Uncategorized' rows as they aren't used for training
         df_labeled = df[df['Category'] != 'Uncategorized']
@@ -20,7 +21,7 @@ def analyze_data_balance():
         
         print("Category Distribution:")
         # The value_counts() function is perfect for this
-        category_counts = df_labeled['Category'].value_counts()
+        category_counts = df_labeled['Category'].cat.remove_unused_categories().value_counts()
         
         print(category_counts)
         
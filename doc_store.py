@@ -0,0 +1,182 @@
+import math
+import mmap
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+from data_io import iter_table, resolve_table_path
+
+# --- Product Document Store ---
+# One aggregated document per ProductId (its non-empty review texts joined by spaces),
+# stored as a UTF-8 blob plus memory-mappable index arrays:
+#   <base>.bin          concatenated documents
+#   <base>.ids.npy      ProductIds, sorted (binary search for random access)
+#   <base>.offsets.npy  byte offset of each document in the blob
+#   <base>.lengths.npy  byte length of each document
+PRODUCT_DOC_STORE = './client_files/product_documents'
+AGGREGATION_CHUNK_SIZE = 100000
+# Reviews are spilled into hash partitions of roughly this size, so the memory
+# needed to aggregate one partition does not grow with the corpus.
+TARGET_PARTITION_BYTES = 64 * 1024 * 1024
+# The same target in rows, for compressed Parquet input: a cleaned review takes about
+# 500 bytes of CSV.
+TARGET_PARTITION_ROWS = TARGET_PARTITION_BYTES // 500
+
+def partition_count(csv_path):
+    """Spill files needed for the cleaned reviews: by byte size for a CSV, by row count for Parquet."""
+    path = resolve_table_path(csv_path)
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        return max(1, math.ceil(pq.ParquetFile(path).metadata.num_rows / TARGET_PARTITION_ROWS))
+    return max(1, math.ceil(os.path.getsize(path) / TARGET_PARTITION_BYTES))
+
+def partition_by_product(csv_path, partition_dir, num_partitions):
+    """
+    Streams ProductId/CleanedText once and appends each row to one of `num_partitions`
+    spill files chosen by a hash of its ProductId. Every product ends up in exactly one file.
+    """
+    paths = [os.path.join(partition_dir, f"partition_{i:04d}.csv") for i in range(num_partitions)]
+    for chunk in iter_table(csv_path, columns=['ProductId', 'CleanedText'], chunksize=AGGREGATION_CHUNK_SIZE):
+        chunk = chunk.dropna(subset=['CleanedText'])
+        partition_ids = pd.util.hash_pandas_object(chunk['ProductId'], index=False) % num_partitions
+        for partition_id, rows in chunk.groupby(partition_ids.to_numpy()):
+            rows.to_csv(paths[partition_id], mode='a', header=False, index=False)
+    return [path for path in paths if os.path.exists(path)]
+
+def aggregate_partition(path):
+    """Joins the review texts of every product in one spill file, in file order."""
+    df_reviews = pd.read_csv(path, names=['ProductId', 'CleanedText'], dtype=str, keep_default_na=False)
+    return df_reviews.groupby('ProductId')['CleanedText'].apply(' '.join).reset_index()
+
+def store_is_fresh(csv_path, base=PRODUCT_DOC_STORE):
+    """True when the store exists and was built after the cleaned reviews were last written."""
+    index_path = f"{base}.ids.npy"
+    if not os.path.exists(index_path):
+        return False
+    return os.path.getmtime(index_path) >= os.path.getmtime(resolve_table_path(csv_path))
+
+def build_doc_store(csv_path, base=PRODUCT_DOC_STORE):
+    """Aggregates the cleaned reviews into a product document store. Returns the number of products."""
+    ids, offsets, lengths = [], [], []
+    offset = 0
+    store_dir = os.path.dirname(base) or '.'
+    with tempfile.TemporaryDirectory(prefix='doc_store_partitions_', dir=store_dir) as partition_dir, \
+            open(f"{base}.bin", 'wb') as blob:
+        for path in partition_by_product(csv_path, partition_dir, partition_count(csv_path)):
+            documents = aggregate_partition(path)
+            for product_id, document in zip(documents['ProductId'], documents['CleanedText']):
+                encoded = document.encode('utf-8')
+                blob.write(encoded)
+                ids.append(product_id)
+                offsets.append(offset)
+                lengths.append(len(encoded))
+                offset += len(encoded)
+
+    order = np.argsort(np.array(ids, dtype=str), kind='stable')
+    np.save(f"{base}.offsets.npy", np.array(offsets, dtype=np.int64)[order])
+    np.save(f"{base}.lengths.npy", np.array(lengths, dtype=np.int64)[order])
+    # Written last: its timestamp marks the store as complete and fresh
+    np.save(f"{base}.ids.npy", np.array(ids, dtype=str)[order])
+    return len(ids)
+
+def update_doc_store(csv_path, product_ids, base=PRODUCT_DOC_STORE):
+    """
+    Re-aggregates only the documents of `product_ids` after a delta clean. Their reviews are
+    collected in one filtered scan, the new documents are appended to the blob and the index
+    is rewritten; products with no reviews left are dropped. Replaced documents stay in the
+    blob as dead bytes until the next full build. Returns the number of documents written.
+    """
+    wanted = set(product_ids)
+    selected = []
+    for chunk in iter_table(csv_path, columns=['ProductId', 'CleanedText'], chunksize=AGGREGATION_CHUNK_SIZE):
+        rows = chunk[chunk['ProductId'].isin(wanted)].dropna(subset=['CleanedText'])
+        if len(rows):
+            selected.append(rows.astype(str))
+    documents = (pd.concat(selected).groupby('ProductId')['CleanedText'].apply(' '.join)
+                 if selected else pd.Series(dtype=str))
+
+    with ProductDocStore(base) as store:
+        keep = ~np.isin(store.ids, np.array(sorted(wanted), dtype=str))
+        ids, offsets, lengths = [store.ids[keep]], [store.offsets[keep]], [store.lengths[keep]]
+    offset = os.path.getsize(f"{base}.bin")
+    new_offsets, new_lengths = [], []
+    with open(f"{base}.bin", 'ab') as blob:
+        for document in documents:
+            encoded = document.encode('utf-8')
+            blob.write(encoded)
+            new_offsets.append(offset)
+            new_lengths.append(len(encoded))
+            offset += len(encoded)
+    ids.append(np.array(documents.index, dtype=str))
+    offsets.append(np.array(new_offsets, dtype=np.int64))
+    lengths.append(np.array(new_lengths, dtype=np.int64))
+
+    ids = np.concatenate(ids)
+    order = np.argsort(ids, kind='stable')
+    np.save(f"{base}.offsets.npy", np.concatenate(offsets)[order])
+    np.save(f"{base}.lengths.npy", np.concatenate(lengths)[order])
+    # Written last: its timestamp marks the store as complete and fresh
+    np.save(f"{base}.ids.npy", ids[order])
+    return len(documents)
+
+class ProductDocStore:
+    """Read-only, memory-mapped access to a product document store."""
+
+    def __init__(self, base=PRODUCT_DOC_STORE):
+        self.base = base
+        self.ids = np.load(f"{base}.ids.npy", mmap_mode='r')
+        self.offsets = np.load(f"{base}.offsets.npy", mmap_mode='r')
+        self.lengths = np.load(f"{base}.lengths.npy", mmap_mode='r')
+        self._file = open(f"{base}.bin", 'rb')
+        # mmap cannot map an empty file
+        self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(f"{base}.bin") else b''
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _position(self, product_id):
+        position = int(np.searchsorted(self.ids, product_id))
+        if position < len(self.ids) and self.ids[position] == product_id:
+            return position
+        return None
+
+    def __contains__(self, product_id):
+        return self._position(product_id) is not None
+
+    def document_at(self, position):
+        start = int(self.offsets[position])
+        return self._blob[start:start + int(self.lengths[position])].decode('utf-8')
+
+    def get(self, product_id, default=None):
+        position = self._position(product_id)
+        return default if position is None else self.document_at(position)
+
+    def __getitem__(self, product_id):
+        position = self._position(product_id)
+        if position is None:
+            raise KeyError(product_id)
+        return self.document_at(position)
+
+    def batch(self, start, stop):
+        """Products [start, stop) in ProductId order, as a ProductId/CleanedText DataFrame."""
+        stop = min(stop, len(self))
+        return pd.DataFrame({
+            'ProductId': self.ids[start:stop].tolist(),
+            'CleanedText': [self.document_at(position) for position in range(start, stop)],
+        })
+
+    def iter_batches(self, batch_size):
+        for start in range(0, len(self), batch_size):
+            yield self.batch(start, start + batch_size)
+
+    def close(self):
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
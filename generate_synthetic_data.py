@@ -0,0 +1,212 @@
+import argparse
+import os
+import sys
+import zipfile
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+# ==============================================================================
+# Synthetic Data Generator
+# ==============================================================================
+# Writes a Reviews.csv-shaped file plus a matching labeled category file
+# (product_categories_standardized.csv, also zipped as pre_scraped_data.zip),
+# so every pipeline step can be run and benchmarked without the client data.
+#
+# The shape follows the Amazon Fine Food Reviews dump: ~0.13 products and
+# ~0.45 users per review with Zipf-like product popularity, mostly 5-star
+# scores, log-normal review lengths, and HTML in roughly a third of reviews
+# (mostly <br /> and entities, some links, rare markup that needs a real parser).
+# ==============================================================================
+
+# --- Configuration ---
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+DEFAULT_OUTPUT_ROOT = './synthetic_data'
+REVIEWS_FILE_NAME = 'Reviews.csv'
+LABELED_FILE_NAME = 'product_categories_standardized.csv'
+ARCHIVE_FILE_NAME = 'pre_scraped_data.zip'
+CHUNK_SIZE = 100000
+LABELED_PRODUCTS = 2500
+MAX_LABELED_REVIEWS = 50        # Reviews kept per labeled product, so memory stays flat at 10M rows
+
+PRODUCTS_PER_REVIEW = 0.13
+USERS_PER_REVIEW = 0.45
+PRODUCT_POPULARITY_EXPONENT = 1.1
+SCORE_PROBABILITIES = [0.09, 0.05, 0.075, 0.14, 0.645]      # 1 to 5 stars
+SENTENCES_LOGNORMAL = (1.2, 0.7)                             # mean, sigma of sentences per review
+FIRST_REVIEW_TIME, LAST_REVIEW_TIME = 939340800, 1351209600  # 1999-10-08 to 2012-10-26
+UNCATEGORIZED_RATE = 0.1                                     # Labeled products whose scrape found no category
+
+# Probability that a review contains each kind of markup
+LINE_BREAK_RATE = 0.3
+ENTITY_RATE = 0.1
+LINK_RATE = 0.04
+INLINE_TAG_RATE = 0.02
+COMPLEX_MARKUP_RATE = 0.002
+
+# --- Vocabulary ---
+# Category share of the products, and the words their reviews are drawn from.
+# Includes the step 2 targeting keywords so keyword targeting finds candidates.
+CATEGORY_WEIGHTS = {
+    'Grocery & Gourmet Food': 0.58,
+    'Pet Supplies': 0.12,
+    'Health & Personal Care': 0.08,
+    'Beauty': 0.05,
+    'Home & Garden': 0.05,
+    'Baby Products': 0.03,
+    'Toys & Games': 0.03,
+    'Books': 0.02,
+    'Outdoors': 0.02,
+    'Automotive & Powersports': 0.02,
+}
+CATEGORY_VOCABULARY = {
+    'Grocery & Gourmet Food': ['coffee', 'tea', 'chocolate', 'snack', 'flavor', 'sauce', 'cookies', 'candy',
+                               'pasta', 'cereal', 'chips', 'honey', 'spice', 'taste', 'sugar', 'organic'],
+    'Pet Supplies': ['dog', 'cat', 'puppy', 'kitten', 'pet', 'fish', 'ferret', 'treats', 'kibble', 'litter', 'vet'],
+    'Health & Personal Care': ['vitamin', 'supplement', 'pill', 'medical', 'health', 'dental', 'protein', 'dose'],
+    'Beauty': ['lotion', 'shampoo', 'conditioner', 'makeup', 'lipstick', 'mascara', 'skin', 'scent', 'hair'],
+    'Home & Garden': ['kitchen', 'garden', 'mug', 'grinder', 'kettle', 'container', 'filter', 'plant'],
+    'Baby Products': ['baby', 'formula', 'toddler', 'infant', 'bottle', 'diaper'],
+    'Toys & Games': ['toy', 'game', 'puzzle', 'doll', 'fun', 'play', 'kids'],
+    'Books': ['book', 'read', 'author', 'novel', 'pages', 'recipes', 'chapter'],
+    'Outdoors': ['outdoor', 'camping', 'hiking', 'sports', 'tent', 'trail'],
+    'Automotive & Powersports': ['car', 'vehicle', 'tire', 'engine', 'automotive', 'road'],
+}
+OPENERS = ['I bought this', 'We ordered the', 'My family loves the', 'I was disappointed by the', 'This is the best',
+           'Not worth it, the', 'I would recommend this', 'Got this', 'Tried the', 'Really happy with the']
+ADJECTIVES = ['great', 'terrible', 'fresh', 'stale', 'cheap', 'excellent', 'small', 'huge', 'perfect', 'okay']
+CLOSERS = ['and it arrived quickly.', 'for the price.', 'and will buy again.', 'but the box was damaged.',
+           'every single day.', 'as a gift.', 'on subscribe and save.', 'compared to the store.', '!', '.']
+FILLER = ['the', 'really', 'very', 'quality', 'product', 'amazon', 'price', 'shipping', 'package', 'good',
+          'bad', 'love', 'would', 'again', 'much', 'better', 'than', 'expected', 'nice', 'just']
+PROFILE_NAMES = ['John', 'Mary', 'coffee lover', 'A. Customer', 'Dog Mom', 'Bob S.', 'Foodie', 'J. Smith']
+SENTENCES_PER_CATEGORY = 400
+SUMMARIES = ['Great!', 'Not as described', 'Delicious', 'My dog loves it', 'Good value', 'Would not buy again',
+             'Five stars', 'Okay', 'Best ever', 'Disappointed']
+
+def build_sentence_pool(rng, words):
+    """Template sentences mixing category words with generic review words."""
+    sentences = []
+    for _ in range(SENTENCES_PER_CATEGORY):
+        noun = rng.choice(words)
+        extra = ' '.join(rng.choice(FILLER + words, size=rng.integers(3, 12)))
+        sentences.append(f"{rng.choice(OPENERS)} {rng.choice(ADJECTIVES)} {noun} {extra} {rng.choice(CLOSERS)}")
+    return np.array(sentences, dtype=object)
+
+def decorate_with_html(rng, sentences, product_id):
+    """Joins a review's sentences, adding the markup mix seen in the real data."""
+    separator = '<br /><br />' if rng.random() < LINE_BREAK_RATE else ' '
+    text = separator.join(sentences)
+    if rng.random() < ENTITY_RATE:
+        text = text.replace(' and ', ' &amp; ', 1) + ' I&#39;d call it &quot;solid&quot;.'
+    if rng.random() < LINK_RATE:
+        text += f' <a href="http://www.amazon.com/gp/product/{product_id}">See it here</a>'
+    if rng.random() < INLINE_TAG_RATE:
+        text = f'<i>{text}</i>'
+    if rng.random() < COMPLEX_MARKUP_RATE:
+        text += ' <!-- copied from my blog --> <span style="color: red">Update: still good</span> 3 < 5'
+    return text
+
+def generate(num_rows, output_dir, seed=42, labeled_products=LABELED_PRODUCTS, chunk_size=CHUNK_SIZE):
+    """
+    Writes Reviews.csv, the labeled category file and its zip archive to `output_dir`.
+    Memory is bounded by `chunk_size` plus MAX_LABELED_REVIEWS reviews per labeled product.
+    Returns a dict of the written paths.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    reviews_path = os.path.join(output_dir, REVIEWS_FILE_NAME)
+    labeled_path = os.path.join(output_dir, LABELED_FILE_NAME)
+    archive_path = os.path.join(output_dir, ARCHIVE_FILE_NAME)
+
+    categories = list(CATEGORY_WEIGHTS)
+    pools = [build_sentence_pool(rng, CATEGORY_VOCABULARY[category]) for category in categories]
+
+    num_products = max(10, int(num_rows * PRODUCTS_PER_REVIEW))
+    num_users = max(10, int(num_rows * USERS_PER_REVIEW))
+    product_ids = np.array([f"B{i:09X}" for i in range(num_products)], dtype=object)
+    product_categories = rng.choice(len(categories), size=num_products, p=list(CATEGORY_WEIGHTS.values()))
+    popularity = 1.0 / np.arange(1, num_products + 1) ** PRODUCT_POPULARITY_EXPONENT
+    popularity /= popularity.sum()
+
+    # Labeled products come from the popular end, so (nearly) all of them have reviews
+    candidates = min(num_products, labeled_products * 2)
+    labeled = rng.choice(candidates, size=min(labeled_products, candidates), replace=False)
+    labeled_text = {int(i): [] for i in labeled}
+
+    written = 0
+    with tqdm(total=num_rows, desc="Generating Reviews") as progress:
+        while written < num_rows:
+            n = min(chunk_size, num_rows - written)
+            products = rng.choice(num_products, size=n, p=popularity)
+            sentence_counts = np.clip(np.rint(rng.lognormal(*SENTENCES_LOGNORMAL, size=n)), 1, 60).astype(int)
+            texts = []
+            for product, count in zip(products, sentence_counts):
+                pool = pools[product_categories[product]]
+                sentences = pool[rng.integers(0, len(pool), size=count)]
+                texts.append(decorate_with_html(rng, sentences, product_ids[product]))
+                if product in labeled_text and len(labeled_text[product]) < MAX_LABELED_REVIEWS:
+                    labeled_text[product].append(' '.join(sentences))
+
+            denominators = rng.geometric(0.5, size=n) - 1
+            chunk = pd.DataFrame({
+                'Id': np.arange(written + 1, written + n + 1),
+                'ProductId': product_ids[products],
+                'UserId': [f"A{u:013X}" for u in rng.integers(0, num_users, size=n)],
+                'ProfileName': rng.choice(PROFILE_NAMES, size=n),
+                'HelpfulnessNumerator': (denominators * rng.random(n)).astype(int),
+                'HelpfulnessDenominator': denominators,
+                'Score': rng.choice(np.arange(1, 6), size=n, p=SCORE_PROBABILITIES),
+                'Time': rng.integers(FIRST_REVIEW_TIME, LAST_REVIEW_TIME, size=n),
+                'Summary': rng.choice(SUMMARIES, size=n),
+                'Text': texts,
+            })
+            chunk.to_csv(reviews_path, index=False, mode='w' if written == 0 else 'a', header=written == 0)
+            written += n
+            progress.update(n)
+
+    # Same columns as the step 2 output, with text lowercased like the scraper's targeting list
+    labeled_rows = [(product_ids[p], categories[product_categories[p]], ' '.join(texts).lower())
+                    for p, texts in labeled_text.items() if texts]
+    df_labeled = pd.DataFrame(labeled_rows, columns=['ProductId', 'Category', 'CleanedText'])
+    uncategorized = rng.random(len(df_labeled)) < UNCATEGORIZED_RATE
+    df_labeled.loc[uncategorized, 'Category'] = 'Uncategorized'
+    df_labeled.to_csv(labeled_path, index=False)
+    with zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.write(labeled_path, arcname=LABELED_FILE_NAME)
+
+    return {'reviews': reviews_path, 'labeled': labeled_path, 'archive': archive_path}
+
+def parse_size(value):
+    """Accepts a preset name (10k, 100k, 1m, 10m) or a plain row count."""
+    if value.lower() in SIZES:
+        return SIZES[value.lower()]
+    if value.isdigit() and int(value) > 0:
+        return int(value)
+    raise argparse.ArgumentTypeError(f"Expected one of {list(SIZES)} or a positive row count, got '{value}'.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate Reviews.csv-shaped synthetic data for offline testing and benchmarks.")
+    parser.add_argument('size', type=parse_size, help=f"Number of reviews: one of {list(SIZES)} or a row count.")
+    parser.add_argument(
+        '--output-dir',
+        default=None,
+        help=f"Directory to write to. Defaults to '{DEFAULT_OUTPUT_ROOT}/<rows>/client_files'."
+    )
+    parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same files.')
+    parser.add_argument(
+        '--labeled-products',
+        type=int,
+        default=LABELED_PRODUCTS,
+        help='Number of products in the labeled category file.'
+    )
+    args = parser.parse_args()
+
+    output_dir = args.output_dir or os.path.join(DEFAULT_OUTPUT_ROOT, str(args.size), 'client_files')
+    if os.path.abspath(output_dir) == os.path.abspath('./client_files'):
+        print("❌ Error: Refusing to overwrite the client data in './client_files'. Choose another --output-dir.")
+        sys.exit(1)
+    paths = generate(args.size, output_dir, args.seed, args.labeled_products)
+    print(f"✅ Synthetic data with {args.size:,} reviews saved to: {output_dir}")
+    for name, path in paths.items():
+        print(f"   - {name}: {path}")
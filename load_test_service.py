@@ -0,0 +1,118 @@
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+from data_io import iter_table
+from pipeline_metrics import LATENCY_PERCENTILES
+
+# ==============================================================================
+# Load Test for the Categorization Service
+#
+# Sends single-product requests from concurrent keep-alive connections and reports
+# client-side latency percentiles and throughput, followed by the service's /stats:
+#   python3 categorization_service.py &
+#   python3 load_test_service.py --concurrency 16 --requests 5000 [--max-p99-ms 10]
+# ==============================================================================
+
+# --- Configuration ---
+DEFAULT_URL = 'http://127.0.0.1:8100'
+SOURCE_FILE = './client_files/Cleaned_Reviews.csv'
+SOURCE_SAMPLE_ROWS = 5000
+FALLBACK_TEXTS = [
+    "Great coffee, rich flavor and fast shipping. Will buy again.",
+    "My dog loves these treats, he waits by the cupboard every evening.",
+    "The chips were stale and the bag arrived crushed.",
+    "This green tea is smooth and not bitter at all.",
+    "Good protein bars for the price, a little too sweet.",
+]
+
+def load_texts(source_file, sample_rows):
+    """Review texts to send: the first rows of the cleaned reviews, or a built-in sample."""
+    try:
+        chunk = next(iter_table(source_file, columns=['ProductId', 'CleanedText'], chunksize=sample_rows))
+    except (FileNotFoundError, StopIteration):
+        print(f"'{source_file}' not found or empty. Using {len(FALLBACK_TEXTS)} built-in texts.")
+        return [(f"SAMPLE{i}", text) for i, text in enumerate(FALLBACK_TEXTS)]
+    chunk = chunk.dropna(subset=['CleanedText'])
+    print(f"Loaded {len(chunk):,} review texts from '{source_file}'.")
+    return list(zip(chunk['ProductId'].astype(str), chunk['CleanedText']))
+
+def run_client(url, texts, offset, num_requests, latencies, errors):
+    """One keep-alive connection sending `num_requests` requests back to back."""
+    connection = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+    headers = {'Content-Type': 'application/json'}
+    try:
+        for i in range(num_requests):
+            product_id, text = texts[(offset + i) % len(texts)]
+            body = json.dumps({'ProductId': product_id, 'text': text}).encode('utf-8')
+            start = time.perf_counter()
+            connection.request('POST', '/predict', body, headers)
+            response = connection.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - start)
+            if response.status != 200:
+                errors.append(response.status)
+    finally:
+        connection.close()
+
+def fetch_stats(url):
+    connection = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+    try:
+        connection.request('GET', '/stats')
+        return json.loads(connection.getresponse().read())
+    finally:
+        connection.close()
+
+def main(base_url, concurrency, num_requests, source_file, max_p99_ms):
+    url = urlparse(base_url)
+    texts = load_texts(source_file, SOURCE_SAMPLE_ROWS)
+
+    latencies, errors = [], []
+    per_client = [num_requests // concurrency + (1 if i < num_requests % concurrency else 0) for i in range(concurrency)]
+    threads = [
+        threading.Thread(target=run_client, args=(url, texts, i * len(texts) // concurrency, count, latencies, errors))
+        for i, count in enumerate(per_client)
+    ]
+    print(f"Sending {num_requests:,} requests over {concurrency} connection(s) to {base_url}...")
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    print("\n--- Client-Side Results ---")
+    print(f"Requests: {len(latencies_ms):,}  errors: {len(errors):,}  throughput: {len(latencies_ms) / elapsed:,.0f} req/s")
+    if len(latencies_ms) == 0:
+        return 1
+    percentiles = dict(zip(LATENCY_PERCENTILES, np.percentile(latencies_ms, LATENCY_PERCENTILES)))
+    print("  ".join(f"p{p}={value:.2f}ms" for p, value in percentiles.items()) + f"  max={latencies_ms.max():.2f}ms")
+
+    print("\n--- Service /stats ---")
+    print(json.dumps(fetch_stats(url), indent=2))
+
+    if errors:
+        print(f"\n❌ {len(errors):,} request(s) failed.")
+        return 1
+    if max_p99_ms is not None and percentiles[99] > max_p99_ms:
+        print(f"\n❌ p99 latency {percentiles[99]:.2f}ms is above the {max_p99_ms}ms target.")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the local categorization service.")
+    parser.add_argument('--url', default=DEFAULT_URL, help='Base URL of the service.')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent keep-alive connections.')
+    parser.add_argument('--requests', type=int, default=2000, help='Total number of requests.')
+    parser.add_argument('--source', default=SOURCE_FILE, help='Cleaned reviews to take request texts from.')
+    parser.add_argument('--max-p99-ms', type=float, default=None, help='Exit with status 1 when p99 latency is above this.')
+    args = parser.parse_args()
+
+    sys.exit(main(args.url, args.concurrency, args.requests, args.source, args.max_p99_ms))
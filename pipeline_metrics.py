@@ -0,0 +1,192 @@
+import cProfile
+import json
+import os
+import resource
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+# --- Pipeline Metrics ---
+# Every step script records wall time, CPU time, memory and row counts for itself
+# and its sub-phases. With --profile they are printed as a summary and appended as
+# JSON lines to <METRICS_DIR>/<run_id>.jsonl, tracemalloc peaks are recorded too, and
+# the hot section of each step is dumped as a cProfile file next to the metrics
+# (inspect with pstats/snakeviz). Without it nothing is written, so step output
+# (e.g. the discovery report) carries no timings.
+# run_pipeline.py sets PIPELINE_RUN_ID so all steps of one run share a file.
+METRICS_DIR = './client_files/metrics'
+RUN_ID_ENV = 'PIPELINE_RUN_ID'
+LATENCY_PERCENTILES = [50, 90, 95, 99]
+
+def new_run_id():
+    return datetime.now().strftime('%Y%m%d-%H%M%S') + f"-{os.getpid()}"
+
+def add_profile_argument(parser):
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help=f"Print a performance summary and save the metrics, tracemalloc peaks and a cProfile of the hot section to '{METRICS_DIR}'."
+    )
+
+def _cpu_seconds():
+    """CPU time of this process plus its reaped children (worker pools)."""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+def _peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(who).ru_maxrss / 1024
+
+class StageMetrics:
+    """
+    Collects the metrics of one step script. Phases are either timed blocks (`phase`),
+    or totals accumulated over many small calls (`add` / `timed_iter`), e.g. the time
+    spent reading CSV chunks interleaved with cleaning them.
+    Peak RSS is the process high-water mark at the end of the phase.
+    Call `close()` in a `finally:` clause, so a step that raises or exits before `finish()`
+    still reports what it did, flagged as failed.
+    """
+
+    def __init__(self, stage, profile=False, metrics_dir=METRICS_DIR):
+        self.stage = stage
+        self.profile = profile
+        self.metrics_dir = metrics_dir
+        self.run_id = os.environ.get(RUN_ID_ENV) or new_run_id()
+        self.records = []
+        self.accumulated = {}
+        self.finished = False
+        self.start_wall = time.perf_counter()
+        self.start_cpu = _cpu_seconds()
+        if profile:
+            tracemalloc.start()
+
+    def _record(self, phase, wall, cpu, rows_in=None, rows_out=None, **extra):
+        record = {
+            'run_id': self.run_id,
+            'stage': self.stage,
+            'phase': phase,
+            'wall_seconds': round(wall, 4),
+            'cpu_seconds': round(cpu, 4) if cpu is not None else None,
+            'peak_rss_mb': round(_peak_rss_mb(), 1),
+            'children_peak_rss_mb': round(_peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+            'rows_in': rows_in,
+            'rows_out': rows_out,
+            'rows_per_second': round(rows_in / wall, 1) if rows_in and wall > 0 else None,
+            **extra,
+        }
+        if self.profile:
+            record['tracemalloc_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+        self.records.append(record)
+        return record
+
+    @contextmanager
+    def phase(self, name, rows_in=None):
+        """
+        Times a block. Set `.rows_in` / `.rows_out` on the yielded dict when they are only known inside it.
+        A block that raises is still recorded, with `failed: true`.
+        """
+        counts = {'rows_in': rows_in, 'rows_out': None}
+        start_wall, start_cpu = time.perf_counter(), _cpu_seconds()
+        failed = True
+        try:
+            yield counts
+            failed = False
+        finally:
+            extra = {'failed': True} if failed else {}
+            self._record(name, time.perf_counter() - start_wall, _cpu_seconds() - start_cpu,
+                         counts['rows_in'], counts['rows_out'], **extra)
+
+    def add(self, name, seconds, rows_in=None, rows_out=None):
+        """Adds one call's duration and rows to an accumulated phase."""
+        total = self.accumulated.setdefault(name, {'seconds': 0.0, 'rows_in': 0, 'rows_out': 0, 'calls': 0})
+        total['seconds'] += seconds
+        total['rows_in'] += rows_in or 0
+        total['rows_out'] += rows_out or 0
+        total['calls'] += 1
+
+    def timed_iter(self, name, iterable):
+        """Yields from `iterable`, accumulating the time spent producing each item and its len() as rows."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            rows = len(item)
+            self.add(name, time.perf_counter() - start, rows, rows)
+            yield item
+
+    def latencies(self, name, seconds):
+        """Records the distribution of per-request latencies (in seconds) as milliseconds."""
+        if len(seconds) == 0:
+            return
+        values_ms = np.asarray(seconds, dtype=float) * 1000
+        percentiles = {f"p{p}_ms": round(float(v), 1) for p, v in zip(LATENCY_PERCENTILES, np.percentile(values_ms, LATENCY_PERCENTILES))}
+        self.records.append({
+            'run_id': self.run_id,
+            'stage': self.stage,
+            'phase': name,
+            'count': len(values_ms),
+            'mean_ms': round(float(values_ms.mean()), 1),
+            'max_ms': round(float(values_ms.max()), 1),
+            **percentiles,
+        })
+
+    @contextmanager
+    def hot_section(self, name):
+        """Runs the block under cProfile when profiling is enabled."""
+        if not self.profile:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            path = os.path.join(self.metrics_dir, f"{self.run_id}_{self.stage}_{name}.prof")
+            profiler.dump_stats(path)
+            print(f"cProfile of '{name}' saved to: {path}")
+
+    def finish(self, rows_in=None, rows_out=None, failed=False):
+        """
+        Records the stage total. With profiling, appends every record to the run's JSONL file
+        and prints a summary. Returns the file's path, or None when nothing was written.
+        Only the first call counts.
+        """
+        if self.finished:
+            return None
+        self.finished = True
+        for name, total in self.accumulated.items():
+            self._record(name, total['seconds'], None, total['rows_in'], total['rows_out'], calls=total['calls'])
+        extra = {'failed': True} if failed else {}
+        self._record('total', time.perf_counter() - self.start_wall, _cpu_seconds() - self.start_cpu, rows_in, rows_out, **extra)
+        if not self.profile:
+            return None
+        tracemalloc.stop()
+
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        path = os.path.join(self.metrics_dir, f"{self.run_id}.jsonl")
+        with open(path, 'a') as f:
+            for record in self.records:
+                f.write(json.dumps(record) + '\n')
+
+        print(f"\n--- Performance Summary ({self.stage}) ---")
+        for record in self.records:
+            if 'wall_seconds' not in record:
+                print(f"{record['phase']:<24} n={record['count']:,}  p50={record['p50_ms']}ms  p99={record['p99_ms']}ms  max={record['max_ms']}ms")
+                continue
+            rate = f"  {record['rows_per_second']:,.0f} rows/s" if record['rows_per_second'] else ""
+            status = "  FAILED" if record.get('failed') else ""
+            print(f"{record['phase']:<24} {record['wall_seconds']:>9.2f}s  peak RSS {record['peak_rss_mb']:,.0f} MB{rate}{status}")
+        print(f"Metrics appended to: {path}")
+        return path
+
+    def close(self):
+        """Finishes the stage as failed if finish() was never reached."""
+        self.finish(failed=True)
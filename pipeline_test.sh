@@ -3,11 +3,13 @@
 # ==============================================================================
 # Automated Test Script for the Amazon Review Categorization Pipeline
 # ==============================================================================
-# This script clones the repository, sets up the environment, and runs three
+# This script clones the repository, sets up the environment, and runs four
 # key tests:
 #   1. A "sad path" test with MISSING arguments.
 #   2. A "sad path" test with an INVALID argument.
 #   3. A "happy path" test using the final production settings.
+#   4. Two delta reruns with unchanged reviews, which must leave the output
+#      as it is and, the second time, skip every stage.
 #
 # Instructions:
 # 1. Ensure data files exist in the project's 'client_files' directory:
@@ -117,6 +119,26 @@ if [[ "$HEADER" == *"CleanedText"* ]]; then
 fi
 echo "✅ The --final flag worked correctly. Output is lean."
 
+# --- TEST CASE 4: NO-OP DELTA RERUN ---
+print_header "Running Test Case 4: Delta Reruns With Unchanged Reviews (--delta --final)..."
+cp "$FINAL_OUTPUT_FILE" "$FINAL_OUTPUT_FILE.before_delta"
+./interview_task.sh --delta --final
+DELTA_LOG=$(./interview_task.sh --delta --final)
+echo "$DELTA_LOG"
+
+if ! cmp -s "$FINAL_OUTPUT_FILE" "$FINAL_OUTPUT_FILE.before_delta"; then
+    echo "❌ FAILED: A delta run with no changed reviews rewrote the final output."
+    exit 1
+fi
+echo "✅ The final output is unchanged after the delta runs."
+
+if echo "$DELTA_LOG" | grep -q "^Running "; then
+    echo "❌ FAILED: The second delta run re-ran a stage although nothing changed."
+    exit 1
+fi
+echo "✅ The second delta run skipped every stage."
+rm "$FINAL_OUTPUT_FILE.before_delta"
+
 # --- FINAL REPORT ---
 print_header "🎉🎉🎉 ALL TESTS PASSED SUCCESSFULLY! 🎉🎉🎉"
 
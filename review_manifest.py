@@ -0,0 +1,115 @@
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+
+# --- Review Manifest ---
+# Records, for every raw review step 1 has cleaned, its Id, a hash of its raw
+# content and its ProductId, plus a fingerprint of the cleaning code. A delta
+# run compares a new Reviews.csv against it to find the rows to (re)clean and
+# the products whose documents and predictions must be refreshed.
+MANIFEST_FILE = './client_files/Cleaned_Reviews.manifest.npz'
+TOUCHED_PRODUCTS_FILE = './client_files/touched_products.csv'
+# Listed instead of ProductIds after a full clean: every product is pending
+ALL_PRODUCTS = '*'
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def row_hashes(chunk):
+    """
+    64-bit content hash per row. Numeric columns are hashed as float64, so an int column and
+    the same values read as floats (because a chunk had a missing value) hash alike and the
+    hash of a row does not depend on the dtypes pandas inferred for its chunk.
+    """
+    normalized = {col: chunk[col].astype('float64') if pd.api.types.is_numeric_dtype(chunk[col]) else chunk[col]
+                  for col in chunk.columns}
+    return pd.util.hash_pandas_object(pd.DataFrame(normalized), index=False).to_numpy()
+
+class ReviewManifest:
+    """Sorted Id -> (content hash, ProductId) arrays for binary-search lookups."""
+
+    def __init__(self, ids, hashes, product_ids, cleaner_version):
+        order = np.argsort(ids, kind='stable')
+        self.ids = np.asarray(ids, dtype=np.int64)[order]
+        self.hashes = np.asarray(hashes, dtype=np.uint64)[order]
+        self.product_ids = np.asarray(product_ids, dtype=str)[order]
+        self.cleaner_version = cleaner_version
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, path=MANIFEST_FILE):
+        """Returns the saved manifest, or None when there is none."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as saved:
+            return cls(saved['ids'], saved['hashes'], saved['product_ids'], str(saved['cleaner_version']))
+
+    def save(self, path=MANIFEST_FILE):
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, ids=self.ids, hashes=self.hashes, product_ids=self.product_ids,
+                 cleaner_version=np.array(self.cleaner_version))
+        os.replace(tmp_path, path)
+
+    def find(self, ids):
+        """Returns (positions, known): manifest position of each id and whether it is in the manifest."""
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.ids, ids), max(len(self.ids) - 1, 0))
+        known = (self.ids[positions] == ids) if len(self.ids) else np.zeros(len(ids), dtype=bool)
+        return positions, known
+
+class ManifestBuilder:
+    """Collects Ids, hashes and ProductIds chunk by chunk while the raw file is streamed."""
+
+    def __init__(self, cleaner_version):
+        self.cleaner_version = cleaner_version
+        self.parts = []
+
+    def add(self, chunk, hashes):
+        self.parts.append((chunk['Id'].to_numpy(dtype=np.int64), hashes, chunk['ProductId'].astype(str).to_numpy()))
+
+    def build(self):
+        if not self.parts:
+            return ReviewManifest([], [], [], self.cleaner_version)
+        ids, hashes, product_ids = (np.concatenate(columns) for columns in zip(*self.parts))
+        return ReviewManifest(ids, hashes, product_ids, self.cleaner_version)
+
+def _read_touched(path):
+    return set(pd.read_csv(path, dtype=str, keep_default_na=False)['ProductId']) if os.path.exists(path) else set()
+
+def write_touched_products(product_ids, path=TOUCHED_PRODUCTS_FILE):
+    """
+    Adds `product_ids` to the products still waiting for step 3 to re-predict them, so two
+    delta cleans without a delta prediction in between lose neither run's products.
+    """
+    pending = _read_touched(path)
+    pending = {ALL_PRODUCTS} if ALL_PRODUCTS in pending else pending | set(product_ids)
+    pd.DataFrame({'ProductId': sorted(pending)}).to_csv(path, index=False)
+
+def mark_all_products_touched(path=TOUCHED_PRODUCTS_FILE):
+    """After a full clean every product is pending, whatever earlier delta runs listed."""
+    pd.DataFrame({'ProductId': [ALL_PRODUCTS]}).to_csv(path, index=False)
+
+def read_touched_products(path=TOUCHED_PRODUCTS_FILE):
+    """
+    ProductIds waiting to be re-predicted (empty when step 3 is up to date), or None when
+    every product is (after a full clean, or no clean yet).
+    """
+    if not os.path.exists(path):
+        return None
+    pending = _read_touched(path)
+    return None if ALL_PRODUCTS in pending else sorted(pending)
+
+def clear_touched_products(path=TOUCHED_PRODUCTS_FILE):
+    """
+    Called by step 3 once its predictions cover every pending product. The file is truncated
+    to its header rather than removed: an empty list means nothing is pending, while a
+    missing file means no clean has written one yet.
+    """
+    pd.DataFrame({'ProductId': []}).to_csv(path, index=False)
@@ -0,0 +1,352 @@
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from pipeline_metrics import RUN_ID_ENV, StageMetrics, new_run_id
+
+# ==============================================================================
+# Pipeline Orchestrator
+# ==============================================================================
+# Runs steps 0 -> 3 as a DAG. Every stage declares its input and output files;
+# a stage is skipped when the hash of its inputs and parameters matches the
+# previous successful run and its outputs are still in place. Independent
+# stages (discovery and cleaning) run concurrently.
+#
+# Usage:
+#   python3 run_pipeline.py [--noscrape | --active-learning] [--final] [--force] [--profile] [auto | <number>]
+#   python3 run_pipeline.py --delta [--final] [--profile]
+#
+# --active-learning makes step 2 scrape in rounds chosen by a quick model (the products
+# it is least sure about) and stop at the target accuracy, instead of the full targeted list.
+#
+# --delta is the daily refresh for a Reviews.csv that gained (or changed) reviews:
+# only those rows are cleaned, and the saved model re-predicts only the products
+# they belong to. Scraping, tuning and training are skipped.
+# ==============================================================================
+
+# --- Configuration ---
+PYTHON = sys.executable or 'python3'
+CLIENT_DIR = 'client_files'
+RAW_DATA_FILE = os.path.join(CLIENT_DIR, 'Reviews.csv')
+DATA_ARCHIVE = os.path.join(CLIENT_DIR, 'pre_scraped_data.zip')
+CLEANED_REVIEWS_FILE = os.path.join(CLIENT_DIR, 'Cleaned_Reviews.csv')
+LABELED_CATEGORIES_FILE = os.path.join(CLIENT_DIR, 'product_categories_standardized.csv')
+TUNING_RESULTS_FILE = os.path.join(CLIENT_DIR, 'tuning_results.json')
+FINAL_OUTPUT_FILE = os.path.join(CLIENT_DIR, 'reviews_with_predicted_categories.csv')
+DISCOVERY_REPORT_FILE = os.path.join(CLIENT_DIR, 'discovery_report.txt')
+PRODUCT_DOC_STORE_FILES = [os.path.join(CLIENT_DIR, f"product_documents.{ext}") for ext in ['bin', 'offsets.npy', 'lengths.npy', 'ids.npy']]
+MANIFEST_FILE = os.path.join(CLIENT_DIR, 'Cleaned_Reviews.manifest.npz')
+LATEST_MODEL_POINTER = os.path.join(CLIENT_DIR, 'models', 'LATEST')
+STATE_FILE = os.path.join(CLIENT_DIR, '.pipeline_state.json')
+HASH_BLOCK_SIZE = 1024 * 1024
+
+STEP0_SCRIPT = 'step_0_data_discovery.py'
+STEP1_SCRIPT = 'step_1_elt.py'
+STEP2_SCRIPT = 'step_2_webscraping_labelled_training_data.py'
+STEP2_5_SCRIPT = 'step_2.5_training_parameter_tuning_optional.py'
+STEP3_SCRIPT = 'step_3_NLP_data_classification_arg.py'
+
+USAGE = "Usage: ./interview_task.sh [--noscrape | --active-learning] [--final] [--force] [--profile] [auto | <number>]  |  --delta [--final] [--profile]"
+
+# --- Helper Functions ---
+def print_header(message):
+    print("")
+    print("=" * 78)
+    print(message)
+    print("=" * 78, flush=True)
+
+def local_modules(script):
+    """
+    The repository modules `script` imports, directly or through other repository modules,
+    read from its import statements. They are part of the stage's code, so they go into its key.
+    """
+    found = set()
+    pending = [script]
+    while pending:
+        with open(pending.pop()) as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                path = name.split('.')[0] + '.py'
+                if path != script and path not in found and os.path.exists(path):
+                    found.add(path)
+                    pending.append(path)
+    return sorted(found)
+
+def script_inputs(script):
+    """A stage script plus every local module it runs."""
+    return [script] + local_modules(script)
+
+class FileHasher:
+    """
+    SHA-256 of file contents, memoized on (size, mtime) in the pipeline state so that
+    unchanged multi-GB inputs are not re-read on every run.
+    """
+
+    def __init__(self, known):
+        self.known = known
+        self.lock = threading.Lock()
+
+    def hash(self, path):
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        fingerprint = [stat.st_size, stat.st_mtime_ns]
+        with self.lock:
+            cached = self.known.get(path)
+        if cached and cached['fingerprint'] == fingerprint:
+            return cached['sha256']
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        with self.lock:
+            self.known[path] = {'fingerprint': fingerprint, 'sha256': digest.hexdigest()}
+        return digest.hexdigest()
+
+class Stage:
+    """One pipeline step: a command (or Python callable) plus the files it reads and writes."""
+
+    def __init__(self, name, title, inputs, outputs, command=None, action=None, deps=(), params=None, log_file=None):
+        self.name = name
+        self.title = title
+        self.inputs = inputs
+        self.outputs = outputs
+        self.command = command
+        self.action = action
+        self.deps = list(deps)
+        self.params = params or {}
+        self.log_file = log_file
+
+    def cache_key(self, hasher):
+        """Content address of this stage: its parameters plus the hash of every input file."""
+        payload = {
+            'params': self.params,
+            'inputs': {path: hasher.hash(path) for path in self.inputs},
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def run(self):
+        if self.action is not None:
+            self.action()
+            return
+        if self.log_file:
+            # Captured so concurrent stages do not interleave their output on the console
+            with open(self.log_file, 'w') as log:
+                subprocess.run(self.command, stdout=log, stderr=subprocess.STDOUT, check=True)
+        else:
+            subprocess.run(self.command, check=True)
+
+def extract_pre_scraped_data():
+    with zipfile.ZipFile(DATA_ARCHIVE) as archive:
+        archive.extract(os.path.basename(LABELED_CATEGORIES_FILE), CLIENT_DIR)
+    # The archive keeps its original timestamps, so drop any Parquet copy left by an earlier scrape.
+    parquet_copy = os.path.splitext(LABELED_CATEGORIES_FILE)[0] + '.parquet'
+    if os.path.exists(parquet_copy):
+        os.remove(parquet_copy)
+    print("✅ Pre-scraped data extracted successfully.")
+
+def build_stages(noscrape, final, max_features_arg, profile=False, delta=False, active_learning=False):
+    """Declares the DAG for one set of command-line flags."""
+    final_flag = ['--final'] if final else []
+    # Not part of any cache key: profiling does not change a stage's outputs
+    profile_flag = ['--profile'] if profile else []
+    # Neither is --delta for cleaning: a delta clean produces the same rows as a full one
+    delta_flag = ['--delta'] if delta else []
+    stages = [
+        Stage('discovery', "Step 0: Data Discovery",
+              inputs=[RAW_DATA_FILE] + script_inputs(STEP0_SCRIPT),
+              outputs=[DISCOVERY_REPORT_FILE],
+              command=[PYTHON, STEP0_SCRIPT, RAW_DATA_FILE] + profile_flag,
+              log_file=DISCOVERY_REPORT_FILE),
+        Stage('clean', "Step 1: Data Cleaning (ELT)",
+              inputs=[RAW_DATA_FILE] + script_inputs(STEP1_SCRIPT),
+              outputs=[CLEANED_REVIEWS_FILE] + PRODUCT_DOC_STORE_FILES,
+              command=[PYTHON, STEP1_SCRIPT, '--workers', str(os.cpu_count() or 1), '--build-doc-store'] + delta_flag + profile_flag),
+    ]
+    if delta:
+        # Keyed on the manifest, not touched_products.csv: step 3 empties that file itself, so
+        # it would never match on the next run. Every clean that touches a product rewrites both.
+        stages.append(Stage('classify', "Step 3 (Delta Mode): Re-predicting Touched Products with the Saved Model",
+                            inputs=[CLEANED_REVIEWS_FILE, MANIFEST_FILE, LATEST_MODEL_POINTER] + script_inputs(STEP3_SCRIPT) + PRODUCT_DOC_STORE_FILES,
+                            outputs=[FINAL_OUTPUT_FILE],
+                            command=[PYTHON, STEP3_SCRIPT, '--delta', '--workers', str(os.cpu_count() or 1)] + final_flag + profile_flag,
+                            deps=['clean'],
+                            params={'final': final, 'delta': True}))
+        return stages
+    if noscrape:
+        stages.append(Stage('labels', "Step 2 (--noscrape): Extracting Pre-Scraped Labeled Data",
+                            inputs=[DATA_ARCHIVE],
+                            outputs=[LABELED_CATEGORIES_FILE],
+                            action=extract_pre_scraped_data,
+                            params={'source': 'archive'}))
+    else:
+        stages.append(Stage('labels', "Step 2: Web Scraping for Labeled Training Data",
+                            inputs=[CLEANED_REVIEWS_FILE] + script_inputs(STEP2_SCRIPT) + PRODUCT_DOC_STORE_FILES,
+                            outputs=[LABELED_CATEGORIES_FILE],
+                            command=[PYTHON, STEP2_SCRIPT] + (['--active-learning'] if active_learning else []) + profile_flag,
+                            deps=['clean'],
+                            params={'source': 'scrape', 'active_learning': active_learning}))
+
+    classify_inputs = [CLEANED_REVIEWS_FILE, LABELED_CATEGORIES_FILE] + script_inputs(STEP3_SCRIPT) + PRODUCT_DOC_STORE_FILES
+    if max_features_arg == 'auto':
+        stages.append(Stage('tune', "Step 2.5 (Auto Mode): Tuning max_features, ngram_range and C",
+                            inputs=[LABELED_CATEGORIES_FILE] + script_inputs(STEP2_5_SCRIPT),
+                            outputs=[TUNING_RESULTS_FILE],
+                            command=[PYTHON, STEP2_5_SCRIPT, '--output', TUNING_RESULTS_FILE] + profile_flag,
+                            deps=['labels']))
+        stages.append(Stage('classify', "Step 3: NLP Classification with optimal settings",
+                            inputs=classify_inputs + [TUNING_RESULTS_FILE],
+                            outputs=[FINAL_OUTPUT_FILE],
+                            command=[PYTHON, STEP3_SCRIPT, '--params', TUNING_RESULTS_FILE] + final_flag + profile_flag,
+                            deps=['clean', 'tune'],
+                            params={'final': final}))
+    else:
+        stages.append(Stage('classify', f"Step 3 (Manual Mode): NLP Classification with max_features = {max_features_arg}",
+                            inputs=classify_inputs,
+                            outputs=[FINAL_OUTPUT_FILE],
+                            command=[PYTHON, STEP3_SCRIPT, '--max_features', max_features_arg] + final_flag + profile_flag,
+                            deps=['clean', 'labels'],
+                            params={'final': final, 'max_features': max_features_arg}))
+    return stages
+
+def load_state():
+    if os.path.exists(STATE_FILE):
+        with open(STATE_FILE) as f:
+            return json.load(f)
+    return {'stages': {}, 'files': {}}
+
+def save_state(state):
+    tmp_path = STATE_FILE + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, STATE_FILE)
+
+def run_pipeline(stages, force=False, max_workers=2, metrics=None):
+    """Runs stages as soon as their dependencies finish, skipping those whose cache key is unchanged."""
+    metrics = metrics if metrics is not None else StageMetrics('run_pipeline')
+    state = load_state()
+    hasher = FileHasher(state['files'])
+    state_lock = threading.Lock()
+    by_name = {stage.name: stage for stage in stages}
+    done, failed = set(), None
+
+    def execute(stage):
+        key = stage.cache_key(hasher)
+        previous = state['stages'].get(stage.name)
+        if not force and previous and previous['key'] == key and all(os.path.exists(p) for p in stage.outputs):
+            print(f"⏩ Skipping {stage.title}: inputs unchanged since {previous['finished_at']}.", flush=True)
+            return 'cached'
+        print_header(f"Running {stage.title}...")
+        start = time.perf_counter()
+        with metrics.phase(stage.name):
+            stage.run()
+        for path in stage.outputs:
+            hasher.hash(path)
+        with state_lock:
+            state['stages'][stage.name] = {'key': key, 'finished_at': time.strftime('%Y-%m-%d %H:%M:%S')}
+            save_state(state)
+        print(f"✅ {stage.title} finished in {time.perf_counter() - start:.1f}s.", flush=True)
+        return 'ran'
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running = {}
+        pending = list(stages)
+        while pending or running:
+            if failed is None:
+                for stage in [s for s in pending if all(dep in done for dep in s.deps)]:
+                    pending.remove(stage)
+                    running[pool.submit(execute, stage)] = stage
+            elif not running:
+                break
+            if not running:
+                missing = {dep for s in pending for dep in s.deps if dep not in by_name}
+                raise RuntimeError(f"Stages {[s.name for s in pending]} cannot run; unknown dependencies {missing}.")
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                try:
+                    future.result()
+                    done.add(stage.name)
+                except Exception as e:
+                    # In-process stages can raise anything; it is still this stage's failure
+                    failed = (stage, e)
+
+    with state_lock:
+        save_state(state)
+    return failed
+
+def parse_args(argv):
+    """Same flags as the original shell orchestrator, plus --force, --profile, --delta and --active-learning."""
+    noscrape, final, force, profile, delta, active_learning, max_features_arg = False, False, False, False, False, False, None
+    for arg in argv:
+        if arg == '--noscrape':
+            noscrape = True
+        elif arg == '--final':
+            final = True
+        elif arg == '--force':
+            force = True
+        elif arg == '--profile':
+            profile = True
+        elif arg == '--delta':
+            delta = True
+        elif arg == '--active-learning':
+            active_learning = True
+        elif arg == 'auto' or arg.isdigit():
+            max_features_arg = arg
+        else:
+            print(f"❌ Error: Invalid argument '{arg}'")
+            print(USAGE)
+            sys.exit(1)
+    if active_learning and (noscrape or delta):
+        print("❌ Error: --active-learning chooses what step 2 scrapes; it cannot be combined with --noscrape or --delta.")
+        print(USAGE)
+        sys.exit(1)
+    if delta and (noscrape or max_features_arg is not None):
+        print("❌ Error: --delta reuses the saved model; it cannot be combined with --noscrape, 'auto' or a max_features value.")
+        print(USAGE)
+        sys.exit(1)
+    if max_features_arg is None and not delta:
+        print("❌ Error: Missing argument. Please provide 'auto' or a numeric value for max_features.")
+        sys.exit(1)
+    return noscrape, final, force, profile, delta, active_learning, max_features_arg
+
+def main(argv):
+    noscrape, final, force, profile, delta, active_learning, max_features_arg = parse_args(argv)
+    print("Ensuring client_files directory exists...")
+    os.makedirs(CLIENT_DIR, exist_ok=True)
+
+    # With --profile, every step appends its metrics to the same <METRICS_DIR>/<run_id>.jsonl
+    os.environ.setdefault(RUN_ID_ENV, new_run_id())
+    metrics = StageMetrics('run_pipeline', profile)
+    start = time.perf_counter()
+    try:
+        failed = run_pipeline(build_stages(noscrape, final, max_features_arg, profile, delta, active_learning), force, metrics=metrics)
+        metrics.finish(failed=failed is not None)
+    finally:
+        metrics.close()
+    if failed is not None:
+        stage, error = failed
+        print(f"❌ Error: {stage.title} failed: {error}")
+        if stage.log_file:
+            print(f"See '{stage.log_file}' for its output.")
+        sys.exit(1)
+
+    print(f"\nDiscovery report: {DISCOVERY_REPORT_FILE}")
+    print_header(f"🎉🎉🎉 Project Pipeline Complete in {time.perf_counter() - start:.1f}s! 🎉🎉🎉")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,103 @@
+import sqlite3
+import time
+import pandas as pd
+
+# --- Configuration ---
+SCRAPE_CACHE_FILE = './client_files/scrape_cache.sqlite'
+DEFAULT_TTL_DAYS = 30
+DEFAULT_FAILURE_RETRY_HOURS = 6
+
+STATUS_OK = 'ok'
+STATUS_NOT_FOUND = 'not_found'
+STATUS_FAILED = 'failed'
+
+def scrape_status(raw_category):
+    if not raw_category or raw_category.startswith("Request Failed"):
+        return STATUS_FAILED
+    if raw_category.startswith("Category Not Found"):
+        return STATUS_NOT_FOUND
+    return STATUS_OK
+
+class ScrapeCache:
+    """
+    Persistent per-ProductId scrape results in SQLite (WAL mode).
+    Every result is committed as soon as it arrives, so an interrupted run loses nothing.
+    Successful lookups expire after `ttl_days`; failed ones are retried after `failure_retry_hours`.
+    LastFailureAt is the time of the latest failed attempt since the last good one, so an
+    expired lookup whose refetch failed also waits `failure_retry_hours` before the next try.
+    """
+
+    def __init__(self, path=SCRAPE_CACHE_FILE, ttl_days=DEFAULT_TTL_DAYS, failure_retry_hours=DEFAULT_FAILURE_RETRY_HOURS):
+        self.path = path
+        self.ttl_seconds = ttl_days * 86400
+        self.failure_retry_seconds = failure_retry_hours * 3600
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS scrapes (
+                ProductId   TEXT PRIMARY KEY,
+                RawCategory TEXT,
+                Category    TEXT,
+                Status      TEXT NOT NULL,
+                FetchedAt   REAL NOT NULL,
+                Attempts    INTEGER NOT NULL DEFAULT 1,
+                LastFailureAt REAL
+            )
+        """)
+        # Caches written before LastFailureAt was added
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(scrapes)")}
+        if 'LastFailureAt' not in columns:
+            self.conn.execute("ALTER TABLE scrapes ADD COLUMN LastFailureAt REAL")
+        self.conn.commit()
+
+    def record(self, product_id, raw_category, category):
+        """
+        Stores one scrape result. A failure never overwrites an earlier successful lookup, nor its
+        FetchedAt; it only sets LastFailureAt, which the next success clears.
+        """
+        status = scrape_status(raw_category)
+        fetched_at = time.time()
+        self.conn.execute("""
+            INSERT INTO scrapes (ProductId, RawCategory, Category, Status, FetchedAt, LastFailureAt)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(ProductId) DO UPDATE SET
+                RawCategory = CASE WHEN excluded.Status = 'failed' AND scrapes.Status != 'failed'
+                                   THEN scrapes.RawCategory ELSE excluded.RawCategory END,
+                Category    = CASE WHEN excluded.Status = 'failed' AND scrapes.Status != 'failed'
+                                   THEN scrapes.Category ELSE excluded.Category END,
+                Status      = CASE WHEN excluded.Status = 'failed' AND scrapes.Status != 'failed'
+                                   THEN scrapes.Status ELSE excluded.Status END,
+                FetchedAt   = CASE WHEN excluded.Status = 'failed' AND scrapes.Status != 'failed'
+                                   THEN scrapes.FetchedAt ELSE excluded.FetchedAt END,
+                Attempts    = scrapes.Attempts + 1,
+                LastFailureAt = excluded.LastFailureAt
+        """, (product_id, raw_category, category, status, fetched_at, fetched_at if status == STATUS_FAILED else None))
+        self.conn.commit()
+
+    def pending(self, product_ids, now=None):
+        """
+        Returns the ids, in their given order, that are missing or expired, unless their last
+        attempt failed too recently to retry.
+        """
+        now = time.time() if now is None else now
+        entries = self.lookup(product_ids).set_index('ProductId')
+        fresh = set(entries.index[
+            ((entries['Status'] != STATUS_FAILED) & (now - entries['FetchedAt'] < self.ttl_seconds))
+            | ((entries['Status'] == STATUS_FAILED) & (now - entries['FetchedAt'] < self.failure_retry_seconds))
+            | (now - entries['LastFailureAt'].astype('float64') < self.failure_retry_seconds)
+        ])
+        return [pid for pid in product_ids if pid not in fresh]
+
+    def lookup(self, product_ids):
+        """Returns the cached rows for the given ids as a DataFrame."""
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (ProductId TEXT PRIMARY KEY)")
+        self.conn.execute("DELETE FROM wanted")
+        self.conn.executemany("INSERT OR IGNORE INTO wanted VALUES (?)", ((pid,) for pid in product_ids))
+        return pd.read_sql_query("""
+            SELECT s.ProductId, s.RawCategory, s.Category, s.Status, s.FetchedAt, s.LastFailureAt
+            FROM scrapes s JOIN wanted w ON s.ProductId = w.ProductId
+        """, self.conn)
+
+    def close(self):
+        self.conn.close()
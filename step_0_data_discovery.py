@@ -1,7 +1,20 @@
 import pandas as pd
+import numpy as np
 import io
-import sys
 import re
+import time
+import argparse
+from collections import Counter
+
+from content_dedup import HyperLogLog
+from pipeline_metrics import StageMetrics, add_profile_argument
+
+# --- Streaming Mode Configuration ---
+STREAMING_CHUNK_SIZE = 50000
+DESCRIBE_PERCENTILES = [0.25, 0.5, 0.75]
+TDIGEST_COMPRESSION = 200
+HLL_PRECISION = 14
+TOP_VALUE_CAPACITY = 1000
 
 def analyze_text_formats(df, sample_size=1000):
     """
@@ -24,7 +37,7 @@ def analyze_text_formats(df, sample_size=1000):
         'Hexadecimal String': re.compile(r'^[0-9a-fA-F]{4,}$'), # At least 4 hex chars
     }
 
-    object_cols = df.select_dtypes(include=['object']).columns
+    object_cols = df.select_dtypes(include=['object', 'category']).columns
     if not any(object_cols):
         print("   No text columns found to analyze.")
         print("-" * 35)
@@ -65,16 +78,25 @@ def analyze_text_formats(df, sample_size=1000):
     print("-" * 35)
 
 
-def analyze_dataset(filepath_or_buffer):
+def analyze_dataset(filepath_or_buffer, metrics=None):
     """
     Reads a CSV file into a pandas DataFrame and performs a preliminary analysis.
 
     Args:
         filepath_or_buffer (str or file-like object): The path to the CSV file or a buffer.
+        metrics (StageMetrics, optional): Receives the CSV read time.
+
+    Returns:
+        int: The number of rows analyzed, or None if the file could not be read.
     """
     try:
         # By default, read_csv uses the first row for column names.
+        # The declared pipeline schemas (category ids, nullable ints) are not used here:
+        # the report profiles the file as pandas infers it.
+        start = time.perf_counter()
         df = pd.read_csv(filepath_or_buffer)
+        if metrics is not None:
+            metrics.add('read_csv', time.perf_counter() - start, len(df), len(df))
 
         print("--- Initial Data Analysis Report ---")
         print("\n")
@@ -126,6 +148,234 @@ def analyze_dataset(filepath_or_buffer):
         analyze_text_formats(df)
 
         print("\n--- End of Report ---")
+        return df.shape[0]
+
+    except FileNotFoundError:
+        print(f"Error: The file '{filepath_or_buffer}' was not found.")
+    except pd.errors.ParserError:
+        print(f"Error: Could not parse the file '{filepath_or_buffer}'. It might not be a valid CSV.")
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+
+
+class RunningStats:
+    """Welford's online mean/variance, merged one chunk at a time (Chan et al. update)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        n = len(values)
+        if n == 0:
+            return
+        chunk_mean = values.mean()
+        chunk_m2 = ((values - chunk_mean) ** 2).sum()
+        delta = chunk_mean - self.mean
+        total = self.count + n
+        self.mean += delta * n / total
+        self.m2 += chunk_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+    @property
+    def std(self):
+        # Sample standard deviation, matching DataFrame.describe()
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+
+class TDigest:
+    """
+    Merging t-digest for approximate quantiles. Each chunk is merged into the existing
+    centroids and re-compressed, so memory is bounded by the compression parameter.
+    """
+
+    def __init__(self, compression=TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+
+    def update(self, values):
+        if len(values) == 0:
+            return
+        means = np.concatenate([self.means, values])
+        weights = np.concatenate([self.weights, np.ones(len(values))])
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+
+        # Centroids sharing the same integer value of the k1 scale function are merged.
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        k = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * q - 1))
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def quantile(self, q):
+        if len(self.means) == 0:
+            return np.nan
+        if len(self.means) == 1:
+            return self.means[0]
+        centers = (np.cumsum(self.weights) - self.weights / 2) / self.weights.sum()
+        return float(np.interp(q, centers, self.means))
+
+
+class Reservoir:
+    """Uniform reservoir sample (Algorithm R) of a column's non-null values."""
+
+    def __init__(self, size, seed=1):
+        self.size = size
+        self.seen = 0
+        self.items = []
+        self.rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        values = list(values)
+        fill = min(len(values), self.size - len(self.items))
+        self.items.extend(values[:fill])
+        self.seen += fill
+        rest = values[fill:]
+        if not rest:
+            return
+        positions = np.arange(self.seen + 1, self.seen + len(rest) + 1)
+        slots = self.rng.integers(0, positions)
+        for item_index in np.flatnonzero(slots < self.size):
+            self.items[slots[item_index]] = rest[item_index]
+        self.seen += len(rest)
+
+
+class TopValues:
+    """Approximate most frequent values, pruned to a fixed capacity after each chunk."""
+
+    def __init__(self, capacity=TOP_VALUE_CAPACITY):
+        self.capacity = capacity
+        self.counts = Counter()
+
+    def update(self, series):
+        self.counts.update(series.value_counts().to_dict())
+        if len(self.counts) > self.capacity:
+            self.counts = Counter(dict(self.counts.most_common(self.capacity)))
+
+    def top(self):
+        return self.counts.most_common(1)[0] if self.counts else (np.nan, np.nan)
+
+
+def analyze_dataset_streaming(filepath_or_buffer, chunk_size=STREAMING_CHUNK_SIZE, sample_size=1000, metrics=None):
+    """
+    Produces the same report as analyze_dataset in a single chunked pass.
+    Statistics are kept online, so peak memory does not grow with the file size.
+
+    Args:
+        filepath_or_buffer (str or file-like object): The path to the CSV file or a buffer.
+        chunk_size (int): Rows read per chunk.
+        sample_size (int): Reservoir size per text column for the format analysis.
+        metrics (StageMetrics, optional): Receives the CSV read time.
+
+    Returns:
+        int: The number of rows analyzed, or None if the file could not be read.
+    """
+    try:
+        head = None
+        row_count = 0
+        columns = []
+        dtypes = {}
+        null_counts = {}
+        numeric_stats, numeric_digests = {}, {}
+        distinct, top_values, reservoirs = {}, {}, {}
+
+        reader = pd.read_csv(filepath_or_buffer, chunksize=chunk_size)
+        if metrics is not None:
+            reader = metrics.timed_iter('read_csv', reader)
+        for chunk in reader:
+            if head is None:
+                head = chunk.head()
+                columns = list(chunk.columns)
+                for col in columns:
+                    null_counts[col] = 0
+                for col in chunk.select_dtypes(include=['number']).columns:
+                    numeric_stats[col] = RunningStats()
+                    numeric_digests[col] = TDigest()
+                for col in chunk.select_dtypes(include=['object', 'string']).columns:
+                    distinct[col] = HyperLogLog(HLL_PRECISION)
+                    top_values[col] = TopValues()
+                    reservoirs[col] = Reservoir(sample_size)
+
+            row_count += len(chunk)
+            for col in columns:
+                dtypes.setdefault(col, chunk[col].dtype)
+                null_counts[col] += int(chunk[col].isnull().sum())
+            for col in numeric_stats:
+                values = pd.to_numeric(chunk[col], errors='coerce').dropna().to_numpy(dtype=np.float64)
+                numeric_stats[col].update(values)
+                numeric_digests[col].update(values)
+            for col in distinct:
+                non_null = chunk[col].dropna()
+                distinct[col].update(non_null)
+                top_values[col].update(non_null)
+                reservoirs[col].update(non_null)
+
+        if head is None:
+            print("Error: The file contains no data rows.")
+            return
+
+        print("--- Initial Data Analysis Report (Streaming) ---")
+        print("\n")
+
+        print("1. Column and Row Overview:")
+        print(f"   - Column names are pulled from the first row of the file.")
+        print(f"   - Number of columns: {len(columns)}")
+        print(f"   - Number of rows: {row_count}")
+        print(f"   - Column Names: {columns}")
+        print("-" * 35)
+
+        print("2. First 5 Rows (Head):")
+        print(head)
+        print("-" * 35)
+
+        print("3. DataFrame Info:")
+        info = pd.DataFrame({
+            'Non-Null Count': [row_count - null_counts[col] for col in columns],
+            'Dtype': [str(dtypes[col]) for col in columns],
+        }, index=columns)
+        print(f"RangeIndex: {row_count} entries")
+        print(info)
+        print("-" * 35)
+
+        print("4. Descriptive Statistics (Numerical, approximate percentiles):")
+        numeric_describe = pd.DataFrame({
+            col: [stats.count, stats.mean, stats.std, stats.min]
+                 + [numeric_digests[col].quantile(q) for q in DESCRIBE_PERCENTILES]
+                 + [stats.max]
+            for col, stats in numeric_stats.items()
+        }, index=['count', 'mean', 'std', 'min'] + [f"{q:.0%}" for q in DESCRIBE_PERCENTILES] + ['max'])
+        print(numeric_describe)
+        print("-" * 35)
+
+        print("5. Descriptive Statistics (Categorical/Object, approximate unique/top):")
+        object_describe = pd.DataFrame({
+            col: [row_count - null_counts[col], distinct[col].estimate(), *top_values[col].top()]
+            for col in distinct
+        }, index=['count', 'unique', 'top', 'freq'])
+        print(object_describe)
+        print("-" * 35)
+
+        print("6. Missing Values Count:")
+        missing_values = pd.Series(null_counts)
+        if missing_values.sum() == 0:
+            print("   No missing values found.")
+        else:
+            print(missing_values[missing_values > 0])
+        print("-" * 35)
+
+        samples = pd.DataFrame({col: pd.Series(reservoir.items, dtype=object) for col, reservoir in reservoirs.items()})
+        analyze_text_formats(samples, sample_size=sample_size)
+
+        print("\n--- End of Report ---")
+        return row_count
 
     except FileNotFoundError:
         print(f"Error: The file '{filepath_or_buffer}' was not found.")
@@ -135,12 +385,24 @@ def analyze_dataset(filepath_or_buffer):
         print(f"An unexpected error occurred: {e}")
 
 if __name__ == '__main__':
-    # Check if a filename is provided as a command-line argument.
-    if len(sys.argv) != 2:
-        print("Usage: python analyze_data.py <path_to_csv_file>")
-        sys.exit(1) # Exit the script if the usage is incorrect.
-
-    # The second command-line argument (sys.argv[1]) is the filename.
-    csv_file = sys.argv[1]
-    analyze_dataset(csv_file)
+    parser = argparse.ArgumentParser(description="Generate a preliminary analysis report for a CSV file.")
+    parser.add_argument('csv_file', help='Path to the CSV file to analyze.')
+    parser.add_argument(
+        '--streaming',
+        action='store_true',
+        help='Profile the file in one chunked pass with bounded memory (approximate percentiles and unique counts).'
+    )
+    add_profile_argument(parser)
+    args = parser.parse_args()
+
+    metrics = StageMetrics('step_0_data_discovery', args.profile)
+    try:
+        with metrics.phase('analyze') as counts, metrics.hot_section('analyze'):
+            if args.streaming:
+                counts['rows_in'] = analyze_dataset_streaming(args.csv_file, metrics=metrics)
+            else:
+                counts['rows_in'] = analyze_dataset(args.csv_file, metrics=metrics)
+        metrics.finish(rows_in=counts['rows_in'])
+    finally:
+        metrics.close()
 
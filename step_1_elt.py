@@ -1,49 +1,261 @@
 import pandas as pd
 from bs4 import BeautifulSoup
 import html
+import os
+import re
 import sys
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 
+import numpy as np
+
+from content_dedup import DuplicateStats, LRUCache, apply_once_per_content
+from data_io import OUTPUT_FORMATS, TableWriter, iter_table, resolve_table_path
+from doc_store import PRODUCT_DOC_STORE, build_doc_store, update_doc_store
+from review_manifest import (
+    MANIFEST_FILE, TOUCHED_PRODUCTS_FILE, ManifestBuilder, ReviewManifest, file_sha256, mark_all_products_touched,
+    row_hashes, write_touched_products,
+)
+from pipeline_metrics import StageMetrics, add_profile_argument
+
 # --- 1. CONFIGURATION ---
 INPUT_FILE_PATH = './client_files/Reviews.csv'
 OUTPUT_FILE_PATH = './client_files/Cleaned_Reviews.csv'
 COLUMN_TO_CLEAN = 'Text'
 CHUNK_SIZE = 50000
+# Chunks allowed in flight per worker; bounds memory when the pool outpaces the writer.
+MAX_CHUNKS_IN_FLIGHT_PER_WORKER = 2
+# Distinct raw texts whose cleaned version each process remembers across chunks
+CLEAN_CACHE_SIZE = 100000
 
 # --- 2. THE FINAL CLEANING FUNCTION ---
+# Fast path: formatting tags whose removal leaves the same text nodes BeautifulSoup
+# would produce. Anything else (comments, scripts, stray '<', entities surviving the
+# first unescape) is left to the real parser so the output stays byte-identical.
+# End tags of void elements (</br>, </hr>) are not matched: html.parser turns them
+# into text-node joins the fast path cannot reproduce.
+VOID_TAG_NAMES = ['br', 'hr']
+SIMPLE_TAG_NAMES = ['a', 'b', 'div', 'em', 'font', 'i', 'li', 'ol', 'p',
+                    'span', 'strong', 'sub', 'sup', 'u', 'ul']
+SIMPLE_TAG_PATTERN = re.compile(
+    r'(?:<(?:' + '|'.join(SIMPLE_TAG_NAMES + VOID_TAG_NAMES) + r')|</(?:' + '|'.join(SIMPLE_TAG_NAMES) + r'))(?=[\s/>])'
+    r'(?:\s+[^\s<>"\'=/]+(?:\s*=\s*(?:"[^"<>]*"|\'[^\'<>]*\'|[^\s"\'<>=`]+))?)*'
+    r'\s*/?>',
+    re.IGNORECASE
+)
+
+def fast_strip_html(text):
+    """Strips simple tags without a parser. Returns None when the markup needs BeautifulSoup."""
+    if '&' in text:
+        return None
+    parts = SIMPLE_TAG_PATTERN.split(text)
+    if any('<' in part for part in parts):
+        return None
+    return ' '.join(stripped for stripped in (part.strip() for part in parts) if stripped)
+
+def soup_strip_html(text):
+    soup = BeautifulSoup(text, 'html.parser')
+    return soup.get_text(separator=' ', strip=True)
+
 def clean_html(html_text):
     if not isinstance(html_text, str):
         return ""
     text = html.unescape(html_text)
     if ('/' in text or '\\' in text) and '<' not in text:
         return text
-    soup = BeautifulSoup(text, 'html.parser')
-    return soup.get_text(separator=' ', strip=True)
+    cleaned = fast_strip_html(text)
+    if cleaned is None:
+        cleaned = soup_strip_html(text)
+    return cleaned
+
+# Per process: each worker keeps its own cache
+_clean_cache = LRUCache(CLEAN_CACHE_SIZE)
+
+def clean_chunk(chunk):
+    """
+    Cleans one chunk, parsing each distinct text once. Runs in a worker process when --workers > 1.
+    Returns (cleaned chunk, distinct text hashes in the chunk, number of texts actually parsed).
+    """
+    cleaned, text_keys, parsed = apply_once_per_content(
+        chunk[COLUMN_TO_CLEAN], lambda texts: [clean_html(text) for text in texts], _clean_cache)
+    chunk['CleanedText'] = cleaned
+    return chunk.drop(columns=[COLUMN_TO_CLEAN]), text_keys, parsed
+
+def timed_clean_chunk(chunk):
+    """clean_chunk plus the seconds it took, measured inside the worker."""
+    start = time.perf_counter()
+    cleaned, text_keys, parsed = clean_chunk(chunk)
+    return cleaned, time.perf_counter() - start, text_keys, parsed
+
+def iter_cleaned_chunks(reader, workers, metrics=None, duplicates=None):
+    """
+    Yields cleaned chunks in their original order.
+    With more than one worker, chunks are cleaned in a process pool while at most
+    workers * MAX_CHUNKS_IN_FLIGHT_PER_WORKER chunks are pending at any time.
+    Cleaning time is added to `metrics` as 'clean_html' (summed across workers),
+    and duplicate texts are counted in `duplicates` (a DuplicateStats).
+    """
+    def collect(result):
+        cleaned, seconds, text_keys, parsed = result
+        if metrics is not None:
+            metrics.add('clean_html', seconds, len(cleaned), len(cleaned))
+        if duplicates is not None:
+            duplicates.add(text_keys, len(cleaned), parsed)
+        return cleaned
+
+    if workers <= 1:
+        for chunk in reader:
+            yield collect(timed_clean_chunk(chunk))
+        return
+
+    max_in_flight = workers * MAX_CHUNKS_IN_FLIGHT_PER_WORKER
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in reader:
+            pending.append(pool.submit(timed_clean_chunk, chunk))
+            if len(pending) >= max_in_flight:
+                yield collect(pending.popleft().result())
+        while pending:
+            yield collect(pending.popleft().result())
 
 # --- 3. MAIN PROCESSING LOGIC ---
-def main():
+def hash_rows(reader, builder):
+    """Passes raw chunks through while recording each row's Id, content hash and ProductId."""
+    for chunk in reader:
+        builder.add(chunk, row_hashes(chunk))
+        yield chunk
+
+def clean_full(reader, workers, output_format, total_chunks, builder, metrics, duplicates):
+    """Cleans every row into a fresh output file. Returns (rows written, output path)."""
+    rows_written = 0
+    with TableWriter(OUTPUT_FILE_PATH, output_format) as writer:
+        # Single writer: chunks arrive in input order no matter which worker cleaned them.
+        cleaned_chunks = iter_cleaned_chunks(hash_rows(reader, builder), workers, metrics, duplicates)
+        for chunk in tqdm(cleaned_chunks, total=total_chunks, desc="Cleaning Reviews"):
+            start = time.perf_counter()
+            writer.write(chunk)
+            metrics.add('write', time.perf_counter() - start, len(chunk), len(chunk))
+            rows_written += len(chunk)
+    return rows_written, writer.path
+
+def clean_delta(reader, workers, manifest, builder, metrics, duplicates):
+    """
+    Cleans only the rows whose Id is new or whose content changed since the manifest was
+    written, and merges them into the existing cleaned CSV. Unchanged rows are not cleaned.
+    Pure appends are appended; changed or deleted rows trigger a streaming rewrite (no
+    cleaning) that drops their old versions, and the new versions are appended at the end.
+    Returns (rows cleaned, ProductIds whose reviews changed).
+    """
+    seen = np.zeros(len(manifest), dtype=bool)
+
+    def delta_chunks():
+        for chunk in reader:
+            hashes = row_hashes(chunk)
+            builder.add(chunk, hashes)
+            positions, known = manifest.find(chunk['Id'])
+            seen[positions[known]] = True
+            unchanged = known.copy()
+            unchanged[known] = manifest.hashes[positions[known]] == hashes[known]
+            if not unchanged.all():
+                yield chunk[~unchanged]
+
+    cleaned = list(tqdm(iter_cleaned_chunks(delta_chunks(), workers, metrics, duplicates), desc="Cleaning New/Changed Reviews"))
+    cleaned = pd.concat(cleaned) if cleaned else pd.DataFrame()
+    positions, known = manifest.find(cleaned['Id']) if len(cleaned) else (np.array([], dtype=int), np.array([], dtype=bool))
+    removed = np.flatnonzero(~seen)
+    print(f"Delta: {int((~known).sum()):,} new, {int(known.sum()):,} changed and {len(removed):,} removed reviews.")
+
+    touched = set(cleaned['ProductId'].astype(str)) if len(cleaned) else set()
+    touched.update(manifest.product_ids[positions[known]])
+    touched.update(manifest.product_ids[removed])
+
+    start = time.perf_counter()
+    if known.any() or len(removed):
+        stale_ids = {str(i) for i in np.concatenate([manifest.ids[positions[known]], manifest.ids[removed]])}
+        tmp_path = OUTPUT_FILE_PATH + '.tmp'
+        # Read and written back as text, so untouched rows keep their exact formatting
+        with pd.read_csv(OUTPUT_FILE_PATH, chunksize=CHUNK_SIZE, dtype=str, keep_default_na=False) as old_chunks:
+            for chunk_number, chunk in enumerate(old_chunks):
+                chunk[~chunk['Id'].isin(stale_ids)].to_csv(tmp_path, index=False, mode='w' if chunk_number == 0 else 'a', header=chunk_number == 0)
+        if len(cleaned):
+            cleaned.to_csv(tmp_path, index=False, mode='a', header=False)
+        os.replace(tmp_path, OUTPUT_FILE_PATH)
+    elif len(cleaned):
+        cleaned.to_csv(OUTPUT_FILE_PATH, index=False, mode='a', header=False)
+    metrics.add('write', time.perf_counter() - start, len(cleaned), len(cleaned))
+    return len(cleaned), touched
+
+def delta_base(output_format, cleaner_version):
+    """The manifest a delta run can build on, or None (with the reason printed) when a full run is needed."""
+    manifest = ReviewManifest.load(MANIFEST_FILE)
+    if manifest is None:
+        reason = f"no manifest at '{MANIFEST_FILE}'"
+    elif manifest.cleaner_version != cleaner_version:
+        reason = "the cleaning code changed since the last run"
+    elif output_format != 'csv' or not os.path.exists(OUTPUT_FILE_PATH) or resolve_table_path(OUTPUT_FILE_PATH) != OUTPUT_FILE_PATH:
+        reason = "delta runs merge into the CSV output, which is missing or superseded by Parquet"
+    else:
+        return manifest
+    print(f"Delta mode: running a full clean because {reason}.")
+    return None
+
+def main(workers=1, output_format='csv', build_store=False, profile=False, delta=False):
+    metrics = StageMetrics('step_1_elt', profile)
     try:
-        print("Calculating total rows for progress bar...")
-        total_rows = sum(1 for row in open(INPUT_FILE_PATH, 'r', encoding='utf-8')) - 1
-        total_chunks = (total_rows // CHUNK_SIZE) + 1
-        print(f"Input file has ~{total_rows:,} rows. Starting processing...")
-
-        is_first_chunk = True
-        
-        with pd.read_csv(INPUT_FILE_PATH, chunksize=CHUNK_SIZE, engine='python') as reader:
-            for chunk in tqdm(reader, total=total_chunks, desc="Cleaning Reviews"):
-                
-                chunk['CleanedText'] = chunk[COLUMN_TO_CLEAN].apply(clean_html)
-                chunk = chunk.drop(columns=[COLUMN_TO_CLEAN])
-
-                if is_first_chunk:
-                    chunk.to_csv(OUTPUT_FILE_PATH, index=False, mode='w')
-                    is_first_chunk = False
-                else:
-                    chunk.to_csv(OUTPUT_FILE_PATH, index=False, mode='a', header=False)
+        with metrics.phase('count_rows'):
+            print("Calculating total rows for progress bar...")
+            total_rows = sum(1 for row in open(INPUT_FILE_PATH, 'r', encoding='utf-8')) - 1
+            total_chunks = (total_rows // CHUNK_SIZE) + 1
+        print(f"Input file has ~{total_rows:,} rows. Starting processing with {workers} worker(s)...")
+
+        # Any change to this file may change the cleaned text, so it invalidates the manifest
+        cleaner_version = file_sha256(os.path.abspath(__file__))
+        manifest = delta_base(output_format, cleaner_version) if delta else None
+        builder = ManifestBuilder(cleaner_version)
+        duplicates = DuplicateStats(exact=profile)
+
+        with metrics.phase('clean') as counts, metrics.hot_section('clean'):
+            reader = metrics.timed_iter('read_csv', iter_table(INPUT_FILE_PATH, chunksize=CHUNK_SIZE))
+            if manifest is None:
+                counts['rows_out'], saved_path = clean_full(reader, workers, output_format, total_chunks, builder, metrics, duplicates)
+                touched = None
+            else:
+                counts['rows_out'], touched = clean_delta(reader, workers, manifest, builder, metrics, duplicates)
+                saved_path = OUTPUT_FILE_PATH
+            new_manifest = builder.build()
+            counts['rows_in'] = len(new_manifest)
+        total_rows, rows_cleaned = len(new_manifest), counts['rows_out']
+        new_manifest.save(MANIFEST_FILE)
 
         print(f"\n✅ Processing complete!")
-        print(f"Cleaned data has been saved to: {OUTPUT_FILE_PATH}")
+        print(f"Cleaned data has been saved to: {saved_path}")
+        print(f"Duplicate texts: {duplicates.summary('cleaned reviews')}")
+
+        if touched is None:
+            # A full run replaces everything; step 3 --delta then predicts every product
+            mark_all_products_touched(TOUCHED_PRODUCTS_FILE)
+        else:
+            # Merged with products an earlier delta run left for step 3, in case it has not run since
+            write_touched_products(touched, TOUCHED_PRODUCTS_FILE)
+            print(f"{len(touched):,} touched ProductIds added to: {TOUCHED_PRODUCTS_FILE}")
+
+        if build_store:
+            if touched is not None and os.path.exists(f"{PRODUCT_DOC_STORE}.ids.npy"):
+                print("\nRe-aggregating the documents of touched products...")
+                with metrics.phase('update_doc_store', rows_in=len(touched)) as counts:
+                    counts['rows_out'] = update_doc_store(OUTPUT_FILE_PATH, touched, PRODUCT_DOC_STORE)
+                print(f"✅ Product document store updated: {PRODUCT_DOC_STORE}.*")
+            else:
+                print("\nAggregating one document per product...")
+                with metrics.phase('build_doc_store', rows_in=total_rows) as counts:
+                    num_products = build_doc_store(OUTPUT_FILE_PATH, PRODUCT_DOC_STORE)
+                    counts['rows_out'] = num_products
+                print(f"✅ Product document store with {num_products:,} products saved to: {PRODUCT_DOC_STORE}.*")
+
+        metrics.finish(rows_in=total_rows, rows_out=rows_cleaned)
 
     except FileNotFoundError:
         print(f"❌ ERROR: The input file was not found at '{INPUT_FILE_PATH}'")
@@ -51,7 +263,35 @@ def main():
     except KeyError:
         print(f"❌ ERROR: A column named '{COLUMN_TO_CLEAN}' was not found in the CSV.")
         sys.exit(1)
+    finally:
+        metrics.close()
 
 # --- 4. SCRIPT EXECUTION ---
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Strip HTML from the raw reviews.")
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of processes used to clean chunks in parallel. Output order is preserved.'
+    )
+    parser.add_argument(
+        '--format',
+        choices=OUTPUT_FORMATS,
+        default='csv',
+        help="Output format. 'parquet' writes one row group per chunk and needs pyarrow."
+    )
+    parser.add_argument(
+        '--build-doc-store',
+        action='store_true',
+        help='Also aggregate one document per ProductId into a memory-mapped store that steps 2 and 3 read.'
+    )
+    parser.add_argument(
+        '--delta',
+        action='store_true',
+        help='Clean only reviews that are new or changed since the last run and merge them into the existing output.'
+    )
+    add_profile_argument(parser)
+    args = parser.parse_args()
+
+    main(args.workers, args.format, args.build_doc_store, args.profile, args.delta)
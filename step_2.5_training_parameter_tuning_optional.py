@@ -1,79 +1,284 @@
-import pandas as pd
+import numpy as np
 from sklearn.model_selection import train_test_split
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import accuracy_score
+from sklearn.preprocessing import normalize
+from concurrent.futures import ProcessPoolExecutor
+import json
+import math
+import os
 import sys
+import time
+import argparse
 import warnings
 
+from data_io import read_table
+from pipeline_metrics import StageMetrics, add_profile_argument
+
 # Suppress warnings from sklearn about categories with no predictions
 warnings.filterwarnings('ignore', category=UserWarning)
 
 # --- Configuration ---
 LABELED_CATEGORIES_FILE = './client_files/product_categories_standardized.csv'
+TUNING_RESULTS_FILE = './client_files/tuning_results.json'
 
 # --- Hyperparameters to Test ---
-# We'll test a range of vocabulary sizes for our model.
+# We'll test a range of vocabulary sizes, n-gram ranges and regularization strengths.
 MAX_FEATURES_TO_TEST = [100, 500, 1000, 2000, 5000, 10000]
+NGRAM_RANGES_TO_TEST = [(1, 1), (1, 2)]
+C_VALUES_TO_TEST = [0.1, 1.0, 10.0]
+
+# --- Successive Halving ---
+# Every rung keeps the best 1/HALVING_FACTOR of the candidates and triples the training data,
+# so weak candidates are dropped after cheap fits on small subsets. The subsets are nested
+# stratified samples, so a small rung sees the category mix of the full training set.
+HALVING_FACTOR = 3
+MIN_RUNG_SAMPLES = 200
+
+# --- Shared Feature Matrix ---
+class FeatureMatrixCache:
+    """
+    Tokenizes and counts the train/test text once with the full unigram+bigram vocabulary.
+    Each (max_features, ngram_range) candidate is then derived by column selection plus IDF
+    weighting, giving the same matrices TfidfVectorizer would build from scratch.
+    Lower halving rungs use a prefix of the training rows (see stratified_order).
+    """
+
+    def __init__(self, X_train, X_test):
+        counter = CountVectorizer(stop_words='english', ngram_range=(1, 2))
+        # CountVectorizer sorts its vocabulary, matching TfidfVectorizer's column order
+        self.train_counts = counter.fit_transform(X_train)
+        self.test_counts = counter.transform(X_test)
+        self.n_train_docs = self.train_counts.shape[0]
+        # Stop words are removed before n-grams are built, so the unigram columns are
+        # exactly the vocabulary an ngram_range=(1, 1) vectorizer would learn.
+        self.unigram_columns = np.flatnonzero([' ' not in term for term in counter.get_feature_names_out()])
+        self._frequencies = {}
+
+    @property
+    def vocabulary_size(self):
+        return self.train_counts.shape[1]
+
+    def frequencies(self, n_rows):
+        """Term and document frequencies over the first n_rows training documents."""
+        if n_rows not in self._frequencies:
+            counts = self.train_counts[:n_rows]
+            term_frequencies = np.asarray(counts.sum(axis=0)).ravel()
+            document_frequencies = np.bincount(counts.indices, minlength=counts.shape[1])
+            self._frequencies[n_rows] = (term_frequencies, document_frequencies)
+        return self._frequencies[n_rows]
+
+    def select_columns(self, max_features, ngram_range=(1, 2), n_rows=None):
+        """The columns TfidfVectorizer keeps for max_features: highest term frequency, in vocabulary order."""
+        if ngram_range == (1, 1):
+            candidates = self.unigram_columns
+        elif ngram_range == (1, 2):
+            candidates = np.arange(self.vocabulary_size)
+        else:
+            raise ValueError(f"Unsupported ngram_range {ngram_range}. Expected (1, 1) or (1, 2).")
+        if max_features >= len(candidates):
+            return candidates
+        term_frequencies, _ = self.frequencies(n_rows or self.n_train_docs)
+        # Same argsort call as CountVectorizer._limit_features, so ties break identically
+        return np.sort(candidates[(-term_frequencies[candidates]).argsort()[:max_features]])
+
+    def tfidf(self, max_features, ngram_range=(1, 2), n_rows=None):
+        """Returns (X_train_tfidf, X_test_tfidf) for one candidate."""
+        n_rows = n_rows or self.n_train_docs
+        columns = self.select_columns(max_features, ngram_range, n_rows)
+        _, document_frequencies = self.frequencies(n_rows)
+        # Smooth IDF, as in TfidfTransformer(smooth_idf=True)
+        idf = np.log((1 + n_rows) / (1 + document_frequencies[columns])) + 1
+        X_train = normalize(self.train_counts[:n_rows][:, columns].multiply(idf).tocsr(), norm='l2')
+        X_test = normalize(self.test_counts[:, columns].multiply(idf).tocsr(), norm='l2')
+        return X_train, X_test
+
+# Worker-process state, set once per worker by the pool initializer
+_worker_features = None
+_worker_labels = None
+
+def _init_worker(features, y_train, y_test):
+    global _worker_features, _worker_labels
+    _worker_features, _worker_labels = features, (y_train, y_test)
+
+def evaluate_c_path(max_features, ngram_range, c_values, n_rows, features=None, labels=None):
+    """
+    Vectorizes once for (max_features, ngram_range) and fits the model for each C in
+    ascending order, warm-starting from the previous solution.
+    Returns a list of (C, accuracy, fit_seconds).
+    """
+    features = features if features is not None else _worker_features
+    y_train, y_test = labels if labels is not None else _worker_labels
+    X_train_tfidf, X_test_tfidf = features.tfidf(max_features, ngram_range, n_rows)
+    model = LogisticRegression(class_weight='balanced', random_state=42, max_iter=1000, warm_start=True)
+    scores = []
+    for c_value in sorted(c_values):
+        start = time.perf_counter()
+        model.set_params(C=c_value)
+        model.fit(X_train_tfidf, y_train[:n_rows])
+        accuracy = accuracy_score(y_test, model.predict(X_test_tfidf))
+        scores.append((c_value, accuracy, time.perf_counter() - start))
+    return scores
 
-def tune_hyperparameters():
+def halving_schedule(n_candidates, n_train, factor=HALVING_FACTOR, min_samples=MIN_RUNG_SAMPLES):
+    """Training-set size for each rung; the last rung always uses all training rows."""
+    n_rungs = max(1, math.ceil(math.log(n_candidates, factor))) if n_candidates > 1 else 1
+    return [min(n_train, max(min_samples, int(n_train / factor ** (n_rungs - 1 - rung)))) for rung in range(n_rungs)]
+
+def stratified_order(y, sizes, random_state=42):
+    """
+    Training-row order in which the first n rows are a stratified sample of y for every n in
+    `sizes`. Each sample is drawn from the next larger one, so the rungs stay nested prefixes.
+    """
+    head = np.arange(len(y))
+    tails = []
+    for size in sorted(set(sizes), reverse=True):
+        if size >= len(head):
+            continue
+        try:
+            head, tail = train_test_split(head, train_size=size, random_state=random_state, stratify=y[head])
+        except ValueError:
+            # More categories than rows, or one category with a single row: keep the shuffled order
+            head, tail = head[:size], head[size:]
+        tails.append(tail)
+    return np.concatenate([head] + tails[::-1])
+
+def run_rung(survivors, n_rows, pool, features, labels):
+    """Evaluates the surviving (max_features, ngram_range, C) candidates on n_rows training rows."""
+    paths = {}
+    for max_features, ngram_range, c_value in survivors:
+        paths.setdefault((max_features, ngram_range), []).append(c_value)
+    keys = list(paths)
+    if pool is None:
+        path_scores = [evaluate_c_path(mf, ngram, paths[(mf, ngram)], n_rows, features, labels) for mf, ngram in keys]
+    else:
+        path_scores = list(pool.map(evaluate_c_path, [k[0] for k in keys], [k[1] for k in keys],
+                                    [paths[k] for k in keys], [n_rows] * len(keys)))
+    scores = {}
+    for (max_features, ngram_range), path in zip(keys, path_scores):
+        for c_value, accuracy, fit_seconds in path:
+            scores[(max_features, ngram_range, c_value)] = (accuracy, fit_seconds)
+    return scores
+
+def tune_hyperparameters(workers=None, results_file=TUNING_RESULTS_FILE, profile=False):
     """
-    Loads the labeled data and tests different 'max_features' settings
-    to find the one that yields the highest accuracy.
+    Loads the labeled data and searches max_features, ngram_range and C with successive
+    halving to find the combination that yields the highest accuracy.
+    Writes the best parameters and every candidate's score to a JSON results file.
     """
-    print("--- Hyperparameter Tuning for max_features ---")
+    print("--- Hyperparameter Tuning (max_features, ngram_range, C) ---")
+    metrics = StageMetrics('step_2.5_tuning', profile)
     try:
         # 1. Load and Prepare the Data (same as Phase 2)
         print(f"Loading labeled data from '{LABELED_CATEGORIES_FILE}'...")
-        training_data_raw = pd.read_csv(LABELED_CATEGORIES_FILE)
-        
+        with metrics.phase('read_table') as counts:
+            training_data_raw = read_table(LABELED_CATEGORIES_FILE, columns=['Category', 'CleanedText'])
+            counts['rows_in'] = counts['rows_out'] = len(training_data_raw)
+
         training_data_raw = training_data_raw[training_data_raw['Category'] != 'Uncategorized'].dropna(subset=['CleanedText'])
-        
+
         if len(training_data_raw) < 50:
             print(f"❌ ERROR: Not enough data ({len(training_data_raw)}) for tuning.")
             sys.exit(1)
-            
+
         category_counts = training_data_raw['Category'].value_counts()
         viable_categories = category_counts[category_counts >= 2].index.tolist()
         training_data = training_data_raw[training_data_raw['Category'].isin(viable_categories)]
-        
+
         # 2. Split the data ONCE. We use the same split for every test for a fair comparison.
         X = training_data['CleanedText']
         y = training_data['Category']
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
-        
-        results = {}
-
-        # 3. Loop through each setting and test it
-        for features in MAX_FEATURES_TO_TEST:
-            print(f"\n--- Testing with max_features = {features} ---")
-            
-            # Vectorize the text with the current setting
-            tfidf = TfidfVectorizer(stop_words='english', max_features=features, ngram_range=(1, 2))
-            X_train_tfidf = tfidf.fit_transform(X_train)
-            X_test_tfidf = tfidf.transform(X_test)
-            
-            # Train the model
-            model = LogisticRegression(class_weight='balanced', random_state=42, max_iter=1000)
-            model.fit(X_train_tfidf, y_train)
-            
-            # Evaluate and store the result
-            y_pred = model.predict(X_test_tfidf)
-            accuracy = accuracy_score(y_test, y_pred)
-            print(f"  ✅ Accuracy: {accuracy:.2%}")
-            results[features] = accuracy
-
-        # 4. Report the best result
-        best_features = max(results, key=results.get)
-        best_accuracy = results[best_features]
-        
+        y_train, y_test = y_train.to_numpy(), y_test.to_numpy()
+        candidates = [(mf, ngram, c) for mf in MAX_FEATURES_TO_TEST for ngram in NGRAM_RANGES_TO_TEST for c in C_VALUES_TO_TEST]
+        schedule = halving_schedule(len(candidates), len(y_train))
+        order = stratified_order(y_train, schedule)
+        X_train, y_train = X_train.iloc[order], y_train[order]
+
+        # 3. Vectorize ONCE. Every candidate is a cheap column selection of this matrix.
+        search_start = time.perf_counter()
+        with metrics.phase('tfidf_fit_transform', rows_in=len(X)):
+            features = FeatureMatrixCache(X_train, X_test)
+        print(f"Built shared count matrix with {features.vocabulary_size:,} terms in {time.perf_counter() - search_start:.1f}s.")
+
+        # 4. Successive halving over the full grid
+        workers = workers or min(len(MAX_FEATURES_TO_TEST) * len(NGRAM_RANGES_TO_TEST), os.cpu_count() or 1)
+        pool = None
+        if workers > 1:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(features, y_train, y_test))
+
+        candidate_log = []
+        survivors = candidates
+        try:
+            for rung, n_rows in enumerate(schedule):
+                print(f"\n--- Rung {rung + 1}/{len(schedule)}: {len(survivors)} candidates on {n_rows:,} training rows ---")
+                with metrics.phase(f"rung_{rung + 1}", rows_in=n_rows * len(survivors)), metrics.hot_section(f"rung_{rung + 1}"):
+                    scores = run_rung(survivors, n_rows, pool, features, (y_train, y_test))
+                for max_features, ngram_range, c_value in survivors:
+                    accuracy, fit_seconds = scores[(max_features, ngram_range, c_value)]
+                    metrics.add('model_fit', fit_seconds, n_rows)
+                    candidate_log.append({
+                        'max_features': max_features, 'ngram_range': list(ngram_range), 'C': c_value,
+                        'rung': rung, 'n_train_samples': n_rows, 'accuracy': accuracy, 'fit_seconds': fit_seconds,
+                    })
+                # Keep the best 1/HALVING_FACTOR (stable: earlier grid order wins ties)
+                ranked = sorted(survivors, key=lambda cand: -scores[cand][0])
+                best_candidate = ranked[0]
+                best_accuracy = scores[best_candidate][0]
+                print(f"  ✅ Best so far: max_features = {best_candidate[0]}, ngram_range = {best_candidate[1]}, "
+                      f"C = {best_candidate[2]} ({best_accuracy:.2%})")
+                if rung < len(schedule) - 1:
+                    survivors = ranked[:max(1, math.ceil(len(survivors) / HALVING_FACTOR))]
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        # 5. Report the best result
+        best_features, best_ngram_range, best_c = best_candidate
+        results = {
+            'best_params': {'max_features': best_features, 'ngram_range': list(best_ngram_range), 'C': best_c},
+            'best_accuracy': best_accuracy,
+            'search_space': {
+                'max_features': MAX_FEATURES_TO_TEST,
+                'ngram_range': [list(ngram) for ngram in NGRAM_RANGES_TO_TEST],
+                'C': C_VALUES_TO_TEST,
+            },
+            'halving_factor': HALVING_FACTOR,
+            'rung_train_samples': schedule,
+            'total_seconds': time.perf_counter() - search_start,
+            'candidates': candidate_log,
+        }
+        with open(results_file, 'w') as f:
+            json.dump(results, f, indent=2)
+
         print("\n--- Tuning Complete ---")
         print(f"Best performance found with max_features = {best_features}")
+        print(f"Best ngram_range = {best_ngram_range}, C = {best_c}")
         print(f"Best Accuracy: {best_accuracy:.2%}")
+        print(f"Results saved to: {results_file}")
+        metrics.finish(rows_in=len(X))
 
     except FileNotFoundError:
         print(f"❌ ERROR: The file '{LABELED_CATEGORIES_FILE}' was not found.")
         sys.exit(1)
+    finally:
+        metrics.close()
 
 if __name__ == "__main__":
-    tune_hyperparameters()
+    parser = argparse.ArgumentParser(description="Tune the TF-IDF + LogisticRegression model.")
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Processes used to evaluate candidates. Defaults to one per vectorizer setting, up to the CPU count.'
+    )
+    parser.add_argument(
+        '--output',
+        default=TUNING_RESULTS_FILE,
+        help='Where to write the JSON results (best params plus every candidate).'
+    )
+    add_profile_argument(parser)
+    args = parser.parse_args()
+
+    tune_hyperparameters(args.workers, args.output, args.profile)
@@ -1,10 +1,25 @@
+import numpy as np
 import pandas as pd
-from bs4 import BeautifulSoup
 import time
 import random
 from tqdm import tqdm
 import sys
-import os
+import re
+import argparse
+import threading
+from itertools import count, islice, zip_longest
+from html.parser import HTMLParser
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import requests
+
+from active_learning import (
+    MIN_TRAINING_ROWS, ROUND_PRODUCTS, ROUNDS_AT_TARGET, SEED_PRODUCTS, TARGET_ACCURACY, UNCERTAINTY_MEASURES, DocumentHasher,
+    cross_validated_accuracy, fit_quick_model, priority_scores, select_next, trainable,
+)
+from data_io import OUTPUT_FORMATS, iter_table, write_table
+from doc_store import PRODUCT_DOC_STORE, ProductDocStore, store_is_fresh
+from scrape_cache import SCRAPE_CACHE_FILE, DEFAULT_TTL_DAYS, DEFAULT_FAILURE_RETRY_HOURS, ScrapeCache
+from pipeline_metrics import StageMetrics, add_profile_argument
 
 # --- Imports for Selenium ---
 from selenium import webdriver
@@ -18,6 +33,18 @@ from webdriver_manager.chrome import ChromeDriverManager
 CLEANED_REVIEWS_FILE = './client_files/Cleaned_Reviews.csv'
 OUTPUT_FILE = './client_files/product_categories_standardized.csv'
 TOTAL_PRODUCTS_TO_SCRAPE = 2500
+TARGETING_CHUNK_SIZE = 100000
+TARGETING_STORE_BATCH = 10000       # Products per batch when reading the product document store
+
+# --- Scraping Engine Configuration ---
+AMAZON_BASE_URL = 'https://www.amazon.com'
+FETCHERS = ['selenium', 'http']
+DEFAULT_WORKERS = 1
+DEFAULT_REQUESTS_PER_SECOND = 1.0   # Shared by all workers
+MAX_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 2.0         # Doubled on every retry, plus jitter
+MAX_FETCHES_IN_FLIGHT_PER_WORKER = 2  # Queued fetches beyond this are submitted as results come back
+BROWSER_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 
 # --- Keyword Dictionary for Targeted Sampling ---
 KEYWORD_MAP = {
@@ -43,107 +70,551 @@ OFFICIAL_CATEGORIES = [
     "Video, DVD & Blu-ray", "Video Games", "Watches"
 ]
 
+# --- Breadcrumb Names That Map onto an Official Category ---
+CATEGORY_SYNONYMS = {
+    "Grocery": "Grocery & Gourmet Food",
+    "Gourmet Food": "Grocery & Gourmet Food",
+    "Health & Household": "Health & Personal Care",
+    "Beauty & Personal Care": "Beauty",
+    "Luxury Beauty": "Beauty",
+    "Sports & Outdoors": "Outdoors",
+    "Toys": "Toys & Games",
+    "Baby": "Baby Products",
+    "Kindle Store": "Amazon Kindle",
+    "Home & Kitchen": "Home & Garden",
+    "Kitchen & Dining": "Home & Garden",
+    "Patio, Lawn & Garden": "Home & Garden",
+    "Electronics": "Consumer Electronics",
+    "Computers & Accessories": "Personal Computers",
+    "Office & School Supplies": "Office Products",
+    "Appliances": "Major Appliances",
+    "Movies & TV": "Video, DVD & Blu-ray",
+    "CDs & Vinyl": "Music and DVD",
+    "Automotive": "Automotive & Powersports",
+}
+CATEGORY_LOOKUP = {**{cat: cat for cat in OFFICIAL_CATEGORIES}, **CATEGORY_SYNONYMS}
+# Longest names first, so 'Sports Collectibles' is tried before 'Sports' at the same position.
+CATEGORY_PATTERN = re.compile(
+    r'(?<!\w)(?:' + '|'.join(re.escape(name) for name in sorted(CATEGORY_LOOKUP, key=len, reverse=True)) + r')(?!\w)'
+)
+
 # --- Enforce Consistency on the Categories Aquired ---
 def standardize_category(scraped_text):
+    """Maps breadcrumb text to the longest official category or synonym it contains (earliest on ties)."""
     if not scraped_text or scraped_text.startswith("Category Not Found") or scraped_text.startswith("Request Failed"):
         return "Uncategorized"
-    for official_cat in OFFICIAL_CATEGORIES:
-        if official_cat in scraped_text:
-            return official_cat
-    return "Uncategorized"
+    matches = [match.group(0) for match in CATEGORY_PATTERN.finditer(scraped_text)]
+    if not matches:
+        return "Uncategorized"
+    return CATEGORY_LOOKUP[max(matches, key=len)]
+
+BREADCRUMB_DIV_ID = 'wayfinding-breadcrumbs_feature_div'
+
+class BreadcrumbExtractor(HTMLParser):
+    """Streaming scan that collects the breadcrumb div's text and stops once the div closes."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.div_depth = 0
+        self.parts = []
+        self.found = False
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.done or tag != 'div':
+            return
+        if self.div_depth:
+            self.div_depth += 1
+        elif dict(attrs).get('id') == BREADCRUMB_DIV_ID:
+            self.div_depth = 1
+            self.found = True
+
+    def handle_endtag(self, tag):
+        if self.div_depth and tag == 'div':
+            self.div_depth -= 1
+            self.done = self.div_depth == 0
+
+    def handle_data(self, data):
+        if self.div_depth:
+            stripped = data.strip()
+            if stripped:
+                self.parts.append(stripped)
+
+def extract_breadcrumb_text(html_chunks):
+    """Feeds page chunks until the breadcrumb div is complete. Returns None if the page has no breadcrumb."""
+    extractor = BreadcrumbExtractor()
+    for chunk in html_chunks:
+        extractor.feed(chunk)
+        if extractor.done:
+            break
+    return ' '.join(extractor.parts) if extractor.found else None
 
 # --- Headless Chrome ProductID Lookup (Loop) ---
-def get_raw_category(driver, product_id):
-    url = f"https://www.amazon.com/dp/{product_id}"
+def get_raw_category(driver, product_id, base_url=AMAZON_BASE_URL):
+    url = f"{base_url}/dp/{product_id}"
     try:
         driver.get(url)
         wait = WebDriverWait(driver, 10)
-        wait.until(EC.presence_of_element_located((By.ID, "wayfinding-breadcrumbs_feature_div")))
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-        breadcrumb_div_soup = soup.find('div', id='wayfinding-breadcrumbs_feature_div')
-        if breadcrumb_div_soup:
-            return breadcrumb_div_soup.get_text(separator=' ', strip=True)
-        else:
-            return "Category Not Found"
+        # Read the one element we need instead of parsing the whole page source
+        breadcrumb_div = wait.until(EC.presence_of_element_located((By.ID, BREADCRUMB_DIV_ID)))
+        return ' '.join(breadcrumb_div.text.split()) or "Category Not Found"
+    except Exception:
+        return "Request Failed"
+
+# --- Plain HTTP ProductID Lookup (pages that render without JavaScript) ---
+def get_raw_category_http(session, product_id, base_url=AMAZON_BASE_URL):
+    url = f"{base_url}/dp/{product_id}"
+    try:
+        with session.get(url, timeout=10, stream=True) as response:
+            response.raise_for_status()
+            response.encoding = response.encoding or 'utf-8'
+            # Stops downloading as soon as the breadcrumb div has been read
+            breadcrumb_text = extract_breadcrumb_text(response.iter_content(chunk_size=16384, decode_unicode=True))
+        return breadcrumb_text if breadcrumb_text else "Category Not Found"
     except Exception:
         return "Request Failed"
 
+def create_driver():
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument(f"user-agent={BROWSER_USER_AGENT}")
+    return webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), options=options)
+
+def create_http_session():
+    session = requests.Session()
+    session.headers['User-Agent'] = BROWSER_USER_AGENT
+    return session
+
+class TokenBucket:
+    """Thread-safe token bucket. Every worker calls acquire() before a request."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class ScraperPool:
+    """
+    Scrapes product pages with N concurrent sessions (headless browsers or HTTP sessions).
+    Each worker thread lazily creates its own session; all workers share one rate limiter.
+    The duration of every request attempt (excluding rate-limit waits) is kept in `latencies`.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, fetcher='selenium', requests_per_second=DEFAULT_REQUESTS_PER_SECOND,
+                 base_url=AMAZON_BASE_URL, max_retries=MAX_RETRIES, backoff_seconds=RETRY_BACKOFF_SECONDS):
+        if fetcher not in FETCHERS:
+            raise ValueError(f"Unknown fetcher '{fetcher}'. Expected one of {FETCHERS}.")
+        self.workers = workers
+        self.fetcher = fetcher
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.rate_limiter = TokenBucket(requests_per_second)
+        self._local = threading.local()
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+        self.latencies = []
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = create_driver() if self.fetcher == 'selenium' else create_http_session()
+            self._local.session = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+
+    def fetch(self, product_id):
+        """Returns the raw breadcrumb text, retrying failed requests with exponential backoff."""
+        lookup = get_raw_category if self.fetcher == 'selenium' else get_raw_category_http
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            session = self._session()
+            start = time.perf_counter()
+            raw_category = lookup(session, product_id, self.base_url)
+            self.latencies.append(time.perf_counter() - start)
+            if raw_category != "Request Failed" or attempt == self.max_retries:
+                return raw_category
+            time.sleep(self.backoff_seconds * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    def scrape(self, product_ids, desc="Targeted Scrape"):
+        """
+        Yields (product_id, raw_category) in completion order, with one progress bar for all workers.
+        At most workers * MAX_FETCHES_IN_FLIGHT_PER_WORKER fetches are queued at any time, and the
+        queued ones are cancelled when the caller stops early (Ctrl-C, or an error while recording).
+        """
+        product_ids = list(product_ids)
+        remaining = iter(product_ids)
+        max_in_flight = self.workers * MAX_FETCHES_IN_FLIGHT_PER_WORKER
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        pending = {}
+        try:
+            with tqdm(total=len(product_ids), desc=desc) as progress:
+                while True:
+                    for pid in islice(remaining, max_in_flight - len(pending)):
+                        pending[executor.submit(self.fetch, pid)] = pid
+                    if not pending:
+                        break
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        progress.update()
+                        yield pending.pop(future), future.result()
+        finally:
+            # Only the fetches already running are finished; nothing new is started
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        with self._sessions_lock:
+            for session in self._sessions:
+                if self.fetcher == 'selenium':
+                    session.quit()
+                else:
+                    session.close()
+            self._sessions = []
+
+def build_keyword_pattern(keyword_map):
+    """One alternation over every keyword (plus a plural 's'), longest first, matched on word boundaries."""
+    keywords = sorted({kw for kws in keyword_map.values() for kw in kws}, key=len, reverse=True)
+    return re.compile(r'\b(?:' + '|'.join(re.escape(kw) for kw in keywords) + r')s?\b', re.IGNORECASE)
+
+def build_product_hit_table(chunks, keyword_map):
+    """
+    Scans review chunks once and counts keyword hits per product and category.
+    Returns (hit table indexed by ProductId with one column per category, all ProductIds).
+    Memory grows with the number of products, not with the amount of review text.
+    """
+    pattern = build_keyword_pattern(keyword_map)
+    keyword_to_categories = {}
+    for category, keywords in keyword_map.items():
+        for kw in keywords:
+            keyword_to_categories.setdefault(kw, []).append(category)
+
+    partial_hits = []
+    product_ids = set()
+    for chunk in chunks:
+        product_ids.update(chunk['ProductId'].unique())
+        matches = chunk['CleanedText'].fillna('').astype(str).str.findall(pattern)
+        hits = pd.DataFrame({'ProductId': chunk['ProductId'], 'Keyword': matches}).explode('Keyword').dropna()
+        if hits.empty:
+            continue
+        keywords = hits['Keyword'].str.lower()
+        singular = keywords.where(keywords.isin(keyword_to_categories), keywords.str[:-1])
+        hits['Category'] = singular.map(keyword_to_categories)
+        hits = hits.explode('Category')
+        partial_hits.append(hits.groupby(['ProductId', 'Category']).size())
+
+    columns = list(keyword_map)
+    if not partial_hits:
+        empty_index = pd.Index([], dtype=object, name='ProductId')
+        return pd.DataFrame(columns=columns, index=empty_index, dtype='int64'), sorted(product_ids)
+    hit_counts = pd.concat(partial_hits).groupby(level=[0, 1]).sum()
+    hit_table = hit_counts.unstack(fill_value=0).reindex(columns=columns, fill_value=0)
+    return hit_table, sorted(product_ids)
+
+def collect_product_text(chunks, product_ids):
+    """Joins the (lowercased) review text of the selected products, in file order."""
+    wanted = set(product_ids)
+    texts = {pid: [] for pid in product_ids}
+    for chunk in chunks:
+        selected = chunk[chunk['ProductId'].isin(wanted)].dropna(subset=['CleanedText'])
+        for pid, text in zip(selected['ProductId'], selected['CleanedText'].astype(str)):
+            texts[pid].append(text)
+    return pd.DataFrame({
+        'ProductId': list(product_ids),
+        'CleanedText': [' '.join(texts[pid]).lower() for pid in product_ids],
+    })
+
+def iter_product_chunks():
+    """
+    ProductId/CleanedText chunks from the product document store when it is fresh,
+    otherwise from the cleaned reviews. Returns (chunks, the open store or None).
+    """
+    if store_is_fresh(CLEANED_REVIEWS_FILE, PRODUCT_DOC_STORE):
+        print(f"Reading product documents from the store at '{PRODUCT_DOC_STORE}'...")
+        store = ProductDocStore(PRODUCT_DOC_STORE)
+        return store.iter_batches(TARGETING_STORE_BATCH), store
+    return iter_table(CLEANED_REVIEWS_FILE, columns=['ProductId', 'CleanedText'], chunksize=TARGETING_CHUNK_SIZE), None
+
+def rank_keyword_matches(hit_table):
+    """Per category, the products with keyword hits, most hits first."""
+    ranked = {}
+    for category in KEYWORD_MAP:
+        matches = hit_table[hit_table[category] > 0]
+        print(f"  - Found {len(matches)} potential '{category}' products.")
+        ranked[category] = matches.reset_index().sort_values([category, 'ProductId'], ascending=[False, True])['ProductId'].tolist()
+    return ranked
+
+def top_up_randomly(product_ids, all_product_ids, total):
+    """Pads the list with a random sample of the other products up to `total`, then truncates to it."""
+    product_ids = list(product_ids)
+    if len(product_ids) < total:
+        print(f"Topping up list with random products to reach {total}.")
+        remaining_needed = total - len(product_ids)
+
+        # Find products that were not targeted and add a random sample of them
+        targeted_set = set(product_ids)
+        random_pool = pd.Series([pid for pid in all_product_ids if pid not in targeted_set])
+        product_ids.extend(random_pool.sample(n=min(remaining_needed, len(random_pool)), random_state=42))
+    return product_ids[:total]
+
+def product_documents(product_ids, store=None):
+    """ProductId/CleanedText (lowercased) of the selected products, read from the store or the cleaned reviews."""
+    if store is not None:
+        # Random reads of just the selected documents
+        with store:
+            return pd.DataFrame({'ProductId': product_ids, 'CleanedText': [store[pid].lower() for pid in product_ids]})
+    return collect_product_text(
+        iter_table(CLEANED_REVIEWS_FILE, columns=['ProductId', 'CleanedText'], chunksize=TARGETING_CHUNK_SIZE), product_ids
+    )
+
 def create_targeted_list():
     """Scans reviews to create a balanced DataFrame of products to scrape."""
     print("--- Creating a Targeted List for Scraping ---")
-    df = pd.read_csv(CLEANED_REVIEWS_FILE)
-    df['CleanedText'] = df['CleanedText'].astype(str)
+    chunks, store = iter_product_chunks()
+    hit_table, all_product_ids = build_product_hit_table(chunks, KEYWORD_MAP)
 
-    # Aggregate all text for each product first
-    product_reviews = df.groupby('ProductId')['CleanedText'].apply(' '.join).str.lower().reset_index()
+    # Within each category, products with the most keyword hits come first
+    targeted_ids = [pid for ranked in rank_keyword_matches(hit_table).values() for pid in ranked]
 
-    targeted_products = pd.DataFrame()
-    for category, keywords in KEYWORD_MAP.items():
-        pattern = '|'.join(keywords)
-        matches = product_reviews[product_reviews['CleanedText'].str.contains(pattern, na=False)]
-        print(f"  - Found {len(matches)} potential '{category}' products.")
-        targeted_products = pd.concat([targeted_products, matches])
-    
     # Remove duplicates in case a product matched multiple categories
-    targeted_products = targeted_products.drop_duplicates(subset=['ProductId'])
-    print(f"\nFound {len(targeted_products)} unique products through keyword targeting.")
-    
-    final_list_df = targeted_products
-    if len(final_list_df) < TOTAL_PRODUCTS_TO_SCRAPE:
-        print(f"Topping up list with random products to reach {TOTAL_PRODUCTS_TO_SCRAPE}.")
-        remaining_needed = TOTAL_PRODUCTS_TO_SCRAPE - len(final_list_df)
-        
-        # Get IDs we've already targeted
-        targeted_ids = set(final_list_df['ProductId'])
-        # Find products that were not targeted
-        random_pool_df = product_reviews[~product_reviews['ProductId'].isin(targeted_ids)]
-        # Add a random sample from the remaining pool
-        final_list_df = pd.concat([final_list_df, random_pool_df.sample(n=remaining_needed, random_state=42)])
-        
-    return final_list_df.head(TOTAL_PRODUCTS_TO_SCRAPE)
-
-def main():
-    df_to_scrape = create_targeted_list()
-
-    print("\n--- Phase 1 (Targeted Scrape): Creating a Balanced Dataset ---")
-    print("Setting up headless Chrome browser...")
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
-    driver = webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), options=options)
-    print("Browser setup complete.")
+    final_ids = list(dict.fromkeys(targeted_ids))
+    print(f"\nFound {len(final_ids)} unique products through keyword targeting.")
+    return product_documents(top_up_randomly(final_ids, all_product_ids, TOTAL_PRODUCTS_TO_SCRAPE), store)
+
+def scrape_pending(scraper, cache, product_ids, metrics, phase='scrape', desc="Targeted Scrape"):
+    """Fetches the products with no fresh cache entry. Returns the number of pages fetched."""
+    to_fetch = cache.pending(product_ids)
+    if to_fetch:
+        with metrics.phase(phase, rows_in=len(to_fetch)) as counts:
+            # Every result is committed to the cache immediately, so an interrupted run resumes where it stopped.
+            for product_id, raw_category in scraper.scrape(to_fetch, desc):
+                cache.record(product_id, raw_category, standardize_category(raw_category))
+            counts['rows_out'] = len(to_fetch)
+    return len(to_fetch)
+
+def cached_categories(cache, product_ids):
+    """Standardized category per product, re-derived from the cached breadcrumb text."""
+    cached = cache.lookup(product_ids)
+    categories = dict(zip(cached['ProductId'], cached['RawCategory'].map(standardize_category)))
+    return pd.Series(product_ids).map(categories).fillna("Uncategorized").to_numpy(dtype=object)
+
+def seed_product_ids(ranked_matches, all_product_ids, seed_size):
+    """Takes the best keyword matches of each category in turn, so the seed covers every category."""
+    interleaved = [pid for rank in zip_longest(*ranked_matches.values()) for pid in rank if pid is not None]
+    return top_up_randomly(list(dict.fromkeys(interleaved))[:seed_size], all_product_ids, seed_size)
+
+def create_active_learning_list(scraper, cache, metrics, target_accuracy=TARGET_ACCURACY, budget=TOTAL_PRODUCTS_TO_SCRAPE,
+                                seed_size=SEED_PRODUCTS, round_size=ROUND_PRODUCTS, measure='margin'):
+    """
+    Scrapes a keyword-targeted seed, then rounds of the products a quick model is least sure
+    about, until its cross-validated accuracy reaches `target_accuracy` or `budget` products
+    are labeled. Returns the labeled products' ProductId/CleanedText.
+    """
+    print("--- Active Learning: Scraping Where the Model Is Least Sure ---")
+    hasher = DocumentHasher()
+    with metrics.phase('targeting') as counts, metrics.hot_section('targeting'):
+        chunks, store = iter_product_chunks()
+        hit_table, all_product_ids = build_product_hit_table(hasher.consume(chunks), KEYWORD_MAP)
+        product_ids, features = hasher.result()
+        counts['rows_out'] = len(product_ids)
+    positions = {pid: i for i, pid in enumerate(product_ids)}
+    batch = seed_product_ids(rank_keyword_matches(hit_table), all_product_ids, min(seed_size, budget))
+    print(f"\nHashed {len(product_ids):,} product documents. Seeding with {len(batch)} keyword-targeted products.")
 
+    labeled = []
+    fetches = rounds_at_target = 0
+    for round_number in count(1):
+        labeled.extend(batch)
+        fetches += scrape_pending(scraper, cache, batch, metrics, f"scrape_round_{round_number}", f"Round {round_number} Scrape")
+        labels = cached_categories(cache, labeled)
+        rows = np.array([positions[pid] for pid in labeled])
+        usable = trainable(labels)
+        model, accuracy = None, 0.0
+        with metrics.phase(f"model_round_{round_number}", rows_in=int(usable.sum())):
+            if usable.sum() >= MIN_TRAINING_ROWS and len(np.unique(labels[usable])) >= 2:
+                accuracy = cross_validated_accuracy(features[rows[usable]], labels[usable])
+                model = fit_quick_model(features[rows[usable]], labels[usable])
+        print(f"Round {round_number}: {len(labeled):,} products labeled ({int(usable.sum()):,} usable), "
+              f"{fetches:,} pages fetched, estimated accuracy {accuracy:.2%}")
+
+        rounds_at_target = rounds_at_target + 1 if accuracy >= target_accuracy else 0
+        if rounds_at_target >= ROUNDS_AT_TARGET:
+            print(f"✅ Reached the {target_accuracy:.1%} accuracy target in {rounds_at_target} consecutive rounds.")
+            break
+        if len(labeled) >= budget:
+            print(f"Stopping: the budget of {budget:,} labeled products is spent.")
+            break
+        candidates = np.setdiff1d(np.arange(len(product_ids)), rows)
+        if len(candidates) == 0:
+            print("Stopping: every product is labeled.")
+            break
+        batch_size = min(round_size, budget - len(labeled))
+        if model is None:
+            # Too few labels for a model yet: explore at random
+            chosen = np.random.default_rng(round_number).choice(candidates, size=min(batch_size, len(candidates)), replace=False)
+        else:
+            scores = priority_scores(model, features[candidates], labels[usable], measure)
+            chosen = candidates[select_next(scores, batch_size)]
+        batch = product_ids[chosen].tolist()
+
+    print(f"\nLabeled {len(labeled):,} products with {fetches:,} page fetches (budget {budget:,} products).")
+    return product_documents(labeled, store)
+
+def main(output_format='csv', workers=DEFAULT_WORKERS, fetcher='selenium',
+         requests_per_second=DEFAULT_REQUESTS_PER_SECOND, base_url=AMAZON_BASE_URL,
+         cache_path=SCRAPE_CACHE_FILE, ttl_days=DEFAULT_TTL_DAYS, failure_retry_hours=DEFAULT_FAILURE_RETRY_HOURS,
+         profile=False, active_learning=False, target_accuracy=TARGET_ACCURACY, budget=TOTAL_PRODUCTS_TO_SCRAPE,
+         seed_size=SEED_PRODUCTS, round_size=ROUND_PRODUCTS, uncertainty='margin'):
+    metrics = StageMetrics('step_2_webscraping', profile)
+    cache = ScrapeCache(cache_path, ttl_days, failure_retry_hours)
+    scraper = None
     try:
-        results = []
-        if os.path.exists(OUTPUT_FILE): #perform cleanup between runs
-            os.remove(OUTPUT_FILE)
-
-        for index, row in tqdm(df_to_scrape.iterrows(), total=len(df_to_scrape), desc="Targeted Scrape"): #Add progress bar here MWMW
-            product_id = row['ProductId']
-            cleaned_text = row['CleanedText'] # Get text from our targeted list
-            
-            raw_category = get_raw_category(driver, product_id)
-            standardized_category = standardize_category(raw_category)
-            
-            # Include CleanedText in the results
-            results.append({'ProductId': product_id, 'Category': standardized_category, 'CleanedText': cleaned_text})
-            
-            time.sleep(random.uniform(0.5, 1.5))
-
-            if len(results) % 50 == 0:
-                pd.DataFrame(results).to_csv(OUTPUT_FILE, index=False)
-        
-        pd.DataFrame(results).to_csv(OUTPUT_FILE, index=False)
-        print(f"\n✅ Targeted scrape complete! Balanced data saved to: {OUTPUT_FILE}")
+        if active_learning:
+            print(f"Scraping with {workers} {fetcher} session(s), limited to {requests_per_second} requests/sec overall...")
+            scraper = ScraperPool(workers, fetcher, requests_per_second, base_url)
+            df_to_scrape = create_active_learning_list(scraper, cache, metrics, target_accuracy, budget,
+                                                       seed_size, round_size, uncertainty)
+        else:
+            with metrics.phase('targeting') as counts, metrics.hot_section('targeting'):
+                df_to_scrape = create_targeted_list()
+                counts['rows_out'] = len(df_to_scrape)
+            print("\n--- Phase 1 (Targeted Scrape): Creating a Balanced Dataset ---")
+            product_ids = df_to_scrape['ProductId'].tolist()
+            to_fetch = cache.pending(product_ids)
+            print(f"Scrape cache '{cache_path}': {len(product_ids) - len(to_fetch)} products up to date, {len(to_fetch)} to fetch.")
+            if to_fetch:
+                print(f"Scraping with {workers} {fetcher} session(s), limited to {requests_per_second} requests/sec overall...")
+                scraper = ScraperPool(workers, fetcher, requests_per_second, base_url)
+                scrape_pending(scraper, cache, to_fetch, metrics)
+        if scraper is not None:
+            metrics.latencies('request_latency', scraper.latencies)
+
+        # Export in one bulk write. Categories are re-derived from the cached breadcrumb text
+        # so matcher improvements apply without rescraping.
+        product_ids = df_to_scrape['ProductId'].tolist()
+        with metrics.phase('export', rows_in=len(product_ids)) as counts:
+            results = pd.DataFrame({
+                'ProductId': df_to_scrape['ProductId'],
+                'Category': cached_categories(cache, product_ids),
+                'CleanedText': df_to_scrape['CleanedText'],
+            })
+            saved_path = write_table(results, OUTPUT_FILE, output_format)
+            counts['rows_out'] = len(results)
+        print(f"\n✅ Targeted scrape complete! Balanced data saved to: {saved_path}")
+        metrics.finish(rows_in=len(product_ids), rows_out=len(results))
 
     except FileNotFoundError:
         print(f"❌ ERROR: The input file was not found at '{CLEANED_REVIEWS_FILE}'")
     finally:
-        driver.quit()
-        print("Browser closed.")
+        cache.close()
+        if scraper is not None:
+            scraper.close()
+            print("Scraper sessions closed.")
+        metrics.close()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Scrape categories for a targeted list of products.")
+    parser.add_argument(
+        '--format',
+        choices=OUTPUT_FORMATS,
+        default='csv',
+        help="Format of the labeled dataset. 'parquet' needs pyarrow."
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=DEFAULT_WORKERS,
+        help='Number of concurrent scraping sessions.'
+    )
+    parser.add_argument(
+        '--fetcher',
+        choices=FETCHERS,
+        default='selenium',
+        help="'selenium' drives headless Chrome; 'http' fetches pages that do not need JavaScript."
+    )
+    parser.add_argument(
+        '--rate',
+        type=float,
+        default=DEFAULT_REQUESTS_PER_SECOND,
+        help='Maximum requests per second across all workers.'
+    )
+    parser.add_argument(
+        '--base-url',
+        default=AMAZON_BASE_URL,
+        help='Site to scrape product pages from, e.g. a local stub server for testing.'
+    )
+    parser.add_argument(
+        '--cache',
+        default=SCRAPE_CACHE_FILE,
+        help='SQLite file that stores scrape results between runs.'
+    )
+    parser.add_argument(
+        '--ttl-days',
+        type=float,
+        default=DEFAULT_TTL_DAYS,
+        help='Successful lookups older than this are fetched again.'
+    )
+    parser.add_argument(
+        '--retry-failed-after-hours',
+        type=float,
+        default=DEFAULT_FAILURE_RETRY_HOURS,
+        help='Failed lookups are retried once they are this old.'
+    )
+    parser.add_argument(
+        '--active-learning',
+        action='store_true',
+        help='Scrape a keyword-targeted seed, then rounds of the products a quick model is least sure about.'
+    )
+    parser.add_argument(
+        '--target-accuracy',
+        type=float,
+        default=TARGET_ACCURACY,
+        help='Active learning stops once the cross-validated accuracy reaches this.'
+    )
+    parser.add_argument(
+        '--budget',
+        type=int,
+        default=TOTAL_PRODUCTS_TO_SCRAPE,
+        help='Active learning stops once this many products are labeled.'
+    )
+    parser.add_argument(
+        '--seed-size',
+        type=int,
+        default=SEED_PRODUCTS,
+        help='Products scraped before the first model is trained.'
+    )
+    parser.add_argument(
+        '--round-size',
+        type=int,
+        default=ROUND_PRODUCTS,
+        help='Products scraped in each active-learning round.'
+    )
+    parser.add_argument(
+        '--uncertainty',
+        choices=UNCERTAINTY_MEASURES,
+        default='margin',
+        help="How unsure the model is about a product: 'margin' between its top two categories, or 'entropy'."
+    )
+    add_profile_argument(parser)
+    args = parser.parse_args()
+
+    main(args.format, args.workers, args.fetcher, args.rate, args.base_url,
+         args.cache, args.ttl_days, args.retry_failed_after_hours, args.profile,
+         args.active_learning, args.target_accuracy, args.budget, args.seed_size, args.round_size, args.uncertainty)
 
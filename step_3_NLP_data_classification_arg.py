@@ -3,88 +3,375 @@ from sklearn.model_selection import train_test_split
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import accuracy_score, classification_report
+import sklearn
+import joblib
+import hashlib
+import json
+import os
 import sys
 import argparse
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from content_dedup import DuplicateStats, LRUCache, apply_once_per_content
+from data_io import read_table, iter_table
+from doc_store import PRODUCT_DOC_STORE, ProductDocStore, store_is_fresh, partition_by_product, partition_count, aggregate_partition
+from pipeline_metrics import StageMetrics, add_profile_argument
+from review_manifest import TOUCHED_PRODUCTS_FILE, clear_touched_products, read_touched_products
+from streaming_training import train_streaming_model
 
 # --- Configuration ---
 CLEANED_REVIEWS_FILE = './client_files/Cleaned_Reviews.csv'
 LABELED_CATEGORIES_FILE = './client_files/product_categories_standardized.csv'
 FINAL_OUTPUT_FILE = './client_files/reviews_with_predicted_categories.csv'
+MODEL_DIR = './client_files/models'
+LATEST_POINTER_NAME = 'LATEST'
+MODEL_ARTIFACT_NAME = 'model.joblib'
+METADATA_ARTIFACT_NAME = 'metadata.json'
+NGRAM_RANGE = (1, 2)
+REGULARIZATION_C = 1.0
+# 'tfidf' fits TF-IDF + LogisticRegression in memory; 'hashing' trains out of core
+TRAINING_ENGINES = ['tfidf', 'hashing']
+ARTIFACT_PREFIXES = {'tfidf': 'tfidf_logreg', 'hashing': 'hashing_sgd'}
+
+# --- Batched Prediction Configuration ---
+STORE_BATCH_PRODUCTS = 5000
+MAX_BATCHES_IN_FLIGHT_PER_WORKER = 2
+# Distinct product documents whose prediction each process remembers across batches
+PREDICTION_CACHE_SIZE = 500000
+
+# --- Model Artifacts ---
+def training_data_hash(training_data):
+    """Content hash of the rows the model was trained on, so artifacts can be traced to their data."""
+    row_hashes = pd.util.hash_pandas_object(training_data[['CleanedText', 'Category']], index=False)
+    return hashlib.sha256(row_hashes.to_numpy().tobytes()).hexdigest()
+
+def save_artifacts(tfidf, model, metadata, model_dir=MODEL_DIR):
+    """Writes the fitted vectorizer and model to a new versioned directory and marks it as latest."""
+    version = datetime.now().strftime('%Y%m%d-%H%M%S')
+    artifact_dir = os.path.join(model_dir, f"{ARTIFACT_PREFIXES[metadata.get('engine', 'tfidf')]}_{version}")
+    os.makedirs(artifact_dir, exist_ok=True)
+    joblib.dump({'tfidf': tfidf, 'model': model}, os.path.join(artifact_dir, MODEL_ARTIFACT_NAME))
+    with open(os.path.join(artifact_dir, METADATA_ARTIFACT_NAME), 'w') as f:
+        json.dump({'version': version, **metadata}, f, indent=2)
+    with open(os.path.join(model_dir, LATEST_POINTER_NAME), 'w') as f:
+        f.write(artifact_dir)
+    return artifact_dir
+
+def load_artifacts(artifact_dir=None, model_dir=MODEL_DIR):
+    """Loads a saved vectorizer and model. Defaults to the most recently trained artifacts."""
+    if artifact_dir is None:
+        with open(os.path.join(model_dir, LATEST_POINTER_NAME)) as f:
+            artifact_dir = f.read().strip()
+    artifacts = joblib.load(os.path.join(artifact_dir, MODEL_ARTIFACT_NAME))
+    with open(os.path.join(artifact_dir, METADATA_ARTIFACT_NAME)) as f:
+        metadata = json.load(f)
+    return artifacts['tfidf'], artifacts['model'], metadata, artifact_dir
 
-def main(max_features_value, is_final_run):
+# --- Training ---
+def load_tuned_params(params_file):
+    """Reads the best parameters written by the step 2.5 tuner."""
+    with open(params_file) as f:
+        best_params = json.load(f)['best_params']
+    return best_params['max_features'], tuple(best_params['ngram_range']), best_params['C']
+
+def train_model(max_features_value, ngram_range=NGRAM_RANGE, c_value=REGULARIZATION_C, metrics=None):
     """
-    Trains a balanced NLP model and predicts categories.
-    Outputs a final, lean CSV if is_final_run is True.
+    Trains and evaluates the TF-IDF + LogisticRegression model. Returns (tfidf, model, metadata).
+    Phase timings go to `metrics`; they are only written out if the caller finishes it.
     """
-    print("\n--- Phase 2: Training NLP Model on Balanced Data ---")
-    try:
-        # 1. Load Data
-        print(f"Loading labeled data from '{LABELED_CATEGORIES_FILE}'...")
-        training_data_raw = pd.read_csv(LABELED_CATEGORIES_FILE)
-        
-        training_data_raw = training_data_raw[training_data_raw['Category'] != 'Uncategorized'].dropna(subset=['CleanedText'])
-        
-        if len(training_data_raw) < 50:
-            print(f"❌ ERROR: Not enough data ({len(training_data_raw)}) for training.")
-            sys.exit(1)
-
-        print(f"Loaded {len(training_data_raw)} successfully scraped categories for training.")
-
-        category_counts = training_data_raw['Category'].value_counts()
-        viable_categories = category_counts[category_counts >= 2].index.tolist()
-        training_data = training_data_raw[training_data_raw['Category'].isin(viable_categories)]
-        
-        # 2. Train-Test Split
-        X = training_data['CleanedText']
-        y = training_data['Category']
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
-        
-        # 3. Feature Extraction (TF-IDF)
-        print(f"Vectorizing text using TF-IDF with max_features = {max_features_value}...")
-        tfidf = TfidfVectorizer(stop_words='english', max_features=max_features_value, ngram_range=(1, 2))
+    metrics = metrics if metrics is not None else StageMetrics('step_3_training')
+    # 1. Load Data
+    print(f"Loading labeled data from '{LABELED_CATEGORIES_FILE}'...")
+    with metrics.phase('read_table') as counts:
+        training_data_raw = read_table(LABELED_CATEGORIES_FILE, columns=['Category', 'CleanedText'])
+        counts['rows_in'] = counts['rows_out'] = len(training_data_raw)
+
+    training_data_raw = training_data_raw[training_data_raw['Category'] != 'Uncategorized'].dropna(subset=['CleanedText'])
+
+    if len(training_data_raw) < 50:
+        print(f"❌ ERROR: Not enough data ({len(training_data_raw)}) for training.")
+        sys.exit(1)
+
+    print(f"Loaded {len(training_data_raw)} successfully scraped categories for training.")
+
+    category_counts = training_data_raw['Category'].value_counts()
+    viable_categories = category_counts[category_counts >= 2].index.tolist()
+    training_data = training_data_raw[training_data_raw['Category'].isin(viable_categories)]
+
+    # 2. Train-Test Split
+    X = training_data['CleanedText']
+    y = training_data['Category']
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+    # 3. Feature Extraction (TF-IDF)
+    print(f"Vectorizing text using TF-IDF with max_features = {max_features_value}, ngram_range = {ngram_range}...")
+    tfidf = TfidfVectorizer(stop_words='english', max_features=max_features_value, ngram_range=ngram_range)
+    with metrics.phase('tfidf_fit_transform', rows_in=len(X)):
         X_train_tfidf = tfidf.fit_transform(X_train)
         X_test_tfidf = tfidf.transform(X_test)
-        
-        # 4. Train the Model
-        model = LogisticRegression(class_weight='balanced', random_state=42, max_iter=1000)
+
+    # 4. Train the Model
+    model = LogisticRegression(C=c_value, class_weight='balanced', random_state=42, max_iter=1000)
+    with metrics.phase('model_fit', rows_in=len(y_train)):
         model.fit(X_train_tfidf, y_train)
-        
-        # 5. Evaluate the Model
-        print("\n--- Model Performance Evaluation ---")
+
+    # 5. Evaluate the Model
+    print("\n--- Model Performance Evaluation ---")
+    with metrics.phase('evaluate', rows_in=len(y_test)):
         y_pred = model.predict(X_test_tfidf)
-        accuracy = accuracy_score(y_test, y_pred)
-        print(f"✅ Model Accuracy on Test Set: {accuracy:.2%}")
-        
-        # 6. Prepare Full Dataset
-        print("\nLoading and aggregating all reviews for final prediction...")
-        df_reviews = pd.read_csv(CLEANED_REVIEWS_FILE).dropna(subset=['CleanedText'])
-        product_reviews = df_reviews.groupby('ProductId')['CleanedText'].apply(' '.join).reset_index()
-
-        # 7. Predict on Entire Dataset
-        all_reviews_tfidf = tfidf.transform(product_reviews['CleanedText'])
-        product_reviews['PredictedCategory'] = model.predict(all_reviews_tfidf)
-        
-        # 8. Save Final File
-        if is_final_run:
-            print("Saving final, production-ready output (without text column)...")
-            final_df = product_reviews[['ProductId', 'PredictedCategory']]
+    accuracy = accuracy_score(y_test, y_pred)
+    print(f"✅ Model Accuracy on Test Set: {accuracy:.2%}")
+
+    metadata = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'engine': 'tfidf',
+        'max_features': max_features_value,
+        'ngram_range': list(ngram_range),
+        'C': c_value,
+        'classes': model.classes_.tolist(),
+        'training_data_file': LABELED_CATEGORIES_FILE,
+        'training_data_hash': training_data_hash(training_data),
+        'training_rows': len(training_data),
+        'accuracy': accuracy,
+        'sklearn_version': sklearn.__version__,
+    }
+    return tfidf, model, metadata
+
+# --- Prediction ---
+def passthrough_batch(task):
+    """For batches that are already loaded DataFrames."""
+    return task
+
+def load_store_batch(task):
+    """Reads products [start, stop) from the product document store."""
+    base, start, stop = task
+    with ProductDocStore(base) as store:
+        return store.batch(start, stop)
+
+# Worker-process state for predict_batch, set once per worker by the pool initializer
+_worker_tfidf = None
+_worker_model = None
+_worker_cache = None
+
+def _init_prediction_worker(tfidf, model):
+    global _worker_tfidf, _worker_model, _worker_cache
+    _worker_tfidf, _worker_model = tfidf, model
+    _worker_cache = LRUCache(PREDICTION_CACHE_SIZE)
+
+def output_columns(include_text):
+    return ['ProductId', 'PredictedCategory', 'CleanedText'] if include_text else ['ProductId', 'PredictedCategory']
+
+def predict_batch(load_documents, task, include_text, tfidf=None, model=None, cache=None):
+    """
+    Loads one batch of product documents, then transforms and predicts them together.
+    Identical documents (variants of one product) are predicted once, and documents already
+    predicted in an earlier batch are taken from `cache`.
+    Returns (predictions, distinct document hashes in the batch, number of documents predicted).
+    """
+    tfidf = tfidf if tfidf is not None else _worker_tfidf
+    model = model if model is not None else _worker_model
+    cache = cache if cache is not None else _worker_cache
+    product_reviews = load_documents(task)
+    categories, document_keys, predicted = apply_once_per_content(
+        product_reviews['CleanedText'], lambda documents: model.predict(tfidf.transform(documents)), cache)
+    product_reviews['PredictedCategory'] = categories
+    return product_reviews[output_columns(include_text)], document_keys, predicted
+
+def iter_batch_predictions(load_documents, tasks, tfidf, model, include_text, workers, duplicates=None):
+    """
+    Yields per-batch predictions in task order, optionally from a process pool.
+    Duplicate documents are counted in `duplicates` (a DuplicateStats).
+    """
+    def collect(result):
+        predictions, document_keys, predicted = result
+        if duplicates is not None:
+            duplicates.add(document_keys, len(predictions), predicted)
+        return predictions
+
+    if workers <= 1:
+        # A fresh cache per call: its entries are only valid for this model
+        cache = LRUCache(PREDICTION_CACHE_SIZE)
+        for task in tasks:
+            yield collect(predict_batch(load_documents, task, include_text, tfidf, model, cache))
+        return
+
+    max_in_flight = workers * MAX_BATCHES_IN_FLIGHT_PER_WORKER
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_prediction_worker, initargs=(tfidf, model)) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(predict_batch, load_documents, task, include_text))
+            if len(pending) >= max_in_flight:
+                yield collect(pending.popleft().result())
+        while pending:
+            yield collect(pending.popleft().result())
+
+def write_predictions(batches, include_text):
+    """
+    Replaces the output file with the prediction batches, written as they arrive. With no
+    batches it is still replaced, by a header-only file. Returns the number of products written.
+    """
+    total_products = 0
+    batches_written = 0
+    for predictions in batches:
+        predictions.to_csv(FINAL_OUTPUT_FILE, index=False, mode='a' if batches_written else 'w', header=not batches_written)
+        total_products += len(predictions)
+        batches_written += 1
+    if not batches_written:
+        pd.DataFrame(columns=output_columns(include_text)).to_csv(FINAL_OUTPUT_FILE, index=False)
+    return total_products
+
+def predict_all_products(tfidf, model, is_final_run, workers=1, profile=False):
+    """
+    Predicts a category for every product in the cleaned reviews and saves the output file.
+    Product documents are read in batches, from the product document store when step 1
+    built a fresh one, otherwise from hash partitions spilled to disk. Peak memory is
+    bounded by the batch size rather than the corpus size.
+    """
+    if is_final_run:
+        print("Saving final, production-ready output (without text column)...")
+    else:
+        print("Saving final output file for validation (with text column)...")
+
+    duplicates = DuplicateStats(exact=profile)
+    # 6. Prepare Full Dataset
+    if store_is_fresh(CLEANED_REVIEWS_FILE, PRODUCT_DOC_STORE):
+        with ProductDocStore(PRODUCT_DOC_STORE) as store:
+            num_products = len(store)
+        print(f"\nReading {num_products:,} product documents from the store at '{PRODUCT_DOC_STORE}'...")
+        tasks = [(PRODUCT_DOC_STORE, start, start + STORE_BATCH_PRODUCTS) for start in range(0, num_products, STORE_BATCH_PRODUCTS)]
+        # 7-8. Predict batch by batch and save incrementally
+        total_products = write_predictions(iter_batch_predictions(load_store_batch, tasks, tfidf, model, not is_final_run, workers, duplicates), not is_final_run)
+    else:
+        num_partitions = partition_count(CLEANED_REVIEWS_FILE)
+        output_dir = os.path.dirname(FINAL_OUTPUT_FILE) or '.'
+        with tempfile.TemporaryDirectory(prefix='step3_partitions_', dir=output_dir) as partition_dir:
+            print(f"\nPartitioning reviews by ProductId into {num_partitions} batch(es)...")
+            paths = partition_by_product(CLEANED_REVIEWS_FILE, partition_dir, num_partitions)
+            # 7-8. Predict batch by batch and save incrementally
+            total_products = write_predictions(iter_batch_predictions(aggregate_partition, paths, tfidf, model, not is_final_run, workers, duplicates), not is_final_run)
+    print(f"Predicted categories for {total_products:,} products.")
+    print(f"Duplicate documents: {duplicates.summary('product documents')}")
+    return total_products
+
+def load_product_documents(product_ids):
+    """
+    Aggregated documents of just `product_ids`, from the product document store when it is
+    fresh, otherwise from one filtered scan of the cleaned reviews.
+    Products with no review text are left out.
+    """
+    if store_is_fresh(CLEANED_REVIEWS_FILE, PRODUCT_DOC_STORE):
+        with ProductDocStore(PRODUCT_DOC_STORE) as store:
+            present = [pid for pid in product_ids if pid in store]
+            return pd.DataFrame({'ProductId': present, 'CleanedText': [store[pid] for pid in present]})
+    wanted = set(product_ids)
+    selected = [chunk[chunk['ProductId'].isin(wanted)].dropna(subset=['CleanedText']).astype(str)
+                for chunk in iter_table(CLEANED_REVIEWS_FILE, columns=['ProductId', 'CleanedText'])]
+    reviews = pd.concat(selected) if selected else pd.DataFrame(columns=['ProductId', 'CleanedText'])
+    return reviews.groupby('ProductId')['CleanedText'].apply(' '.join).reset_index()
+
+def predict_touched_products(tfidf, model, is_final_run, product_ids, workers=1):
+    """
+    Re-predicts only the products touched by a delta clean and merges them into the existing
+    output: their old rows are dropped in a streaming rewrite and the new ones appended.
+    Returns the number of products predicted, or None when the existing output cannot be
+    merged into (missing, or written with the other --final setting).
+    """
+    columns = output_columns(not is_final_run)
+    if not os.path.exists(FINAL_OUTPUT_FILE) or pd.read_csv(FINAL_OUTPUT_FILE, nrows=0).columns.tolist() != columns:
+        return None
+    if not product_ids:
+        print("\nNo products touched since the last prediction; the existing output is up to date.")
+        return 0
+
+    documents = load_product_documents(product_ids)
+    print(f"\nRe-predicting {len(documents):,} of {len(product_ids):,} touched products "
+          f"({len(product_ids) - len(documents):,} have no reviews left)...")
+    tasks = [documents.iloc[start:start + STORE_BATCH_PRODUCTS].copy() for start in range(0, len(documents), STORE_BATCH_PRODUCTS)]
+    predictions = list(iter_batch_predictions(passthrough_batch, tasks, tfidf, model, not is_final_run, workers))
+
+    touched = set(product_ids)
+    tmp_path = FINAL_OUTPUT_FILE + '.tmp'
+    # Written first, so the merged file has it even when the old one held only a header
+    pd.DataFrame(columns=columns).to_csv(tmp_path, index=False)
+    # Read and written back as text, so untouched rows keep their exact formatting
+    with pd.read_csv(FINAL_OUTPUT_FILE, chunksize=STORE_BATCH_PRODUCTS * 10, dtype=str, keep_default_na=False) as old_chunks:
+        for chunk in old_chunks:
+            chunk[~chunk['ProductId'].isin(touched)].to_csv(tmp_path, index=False, mode='a', header=False)
+    for batch in predictions:
+        batch.to_csv(tmp_path, index=False, mode='a', header=False)
+    os.replace(tmp_path, FINAL_OUTPUT_FILE)
+    return len(documents)
+
+def main(max_features_value, is_final_run, predict_only=False, model_path=None, workers=1, params_file=None, profile=False,
+         delta=False, engine='tfidf', compare_engines=False):
+    """
+    Trains a balanced NLP model and predicts categories.
+    Outputs a final, lean CSV if is_final_run is True.
+    With predict_only, a saved model is loaded instead of training a new one.
+    With delta, a saved model re-predicts only the products touched by the last delta clean.
+    With engine='hashing', the model is trained out of core on hashed features; compare_engines
+    also fits the TF-IDF engine on the same split and reports both accuracies.
+    """
+    metrics = StageMetrics('step_3_classification', profile)
+    try:
+        if predict_only or delta:
+            print("\n--- Phase 2: Categorizing with a Saved NLP Model ---")
+            with metrics.phase('load_artifacts'):
+                tfidf, model, metadata, artifact_dir = load_artifacts(model_path)
+            print(f"Loaded model '{artifact_dir}' (max_features = {metadata['max_features']}, "
+                  f"accuracy = {metadata['accuracy']:.2%}, {len(metadata['classes'])} classes).")
         else:
-            print("Saving final output file for validation (with text column)...")
-            final_df = product_reviews[['ProductId', 'PredictedCategory', 'CleanedText']]
-        
-        final_df.to_csv(FINAL_OUTPUT_FILE, index=False)
-        
+            print("\n--- Phase 2: Training NLP Model on Balanced Data ---")
+            ngram_range, c_value = NGRAM_RANGE, REGULARIZATION_C
+            if params_file:
+                max_features_value, ngram_range, c_value = load_tuned_params(params_file)
+                print(f"Using tuned parameters from '{params_file}': max_features = {max_features_value}, "
+                      f"ngram_range = {ngram_range}, C = {c_value}")
+            if engine == 'hashing':
+                print("Training the out-of-core engine (hashed features, SGD partial_fit)...")
+                compare_tfidf = {'max_features': max_features_value, 'ngram_range': list(ngram_range), 'C': c_value} if compare_engines else None
+                try:
+                    tfidf, model, metadata = train_streaming_model(LABELED_CATEGORIES_FILE, metrics, compare_tfidf=compare_tfidf)
+                except ValueError as e:
+                    print(f"❌ ERROR: {e}")
+                    sys.exit(1)
+            else:
+                tfidf, model, metadata = train_model(max_features_value, ngram_range, c_value, metrics)
+            artifact_dir = save_artifacts(tfidf, model, metadata)
+            print(f"Model artifacts saved to: {artifact_dir}")
+
+        with metrics.phase('predict') as counts, metrics.hot_section('predict'):
+            total_products = None
+            touched = read_touched_products(TOUCHED_PRODUCTS_FILE) if delta else None
+            if delta and touched is None:
+                print(f"Delta mode: no '{TOUCHED_PRODUCTS_FILE}' from a delta clean, so every product is predicted.")
+            elif touched is not None:
+                total_products = predict_touched_products(tfidf, model, is_final_run, touched, workers)
+                if total_products is None:
+                    print(f"Delta mode: '{FINAL_OUTPUT_FILE}' is missing or has other columns, so every product is predicted.")
+            if total_products is None:
+                total_products = predict_all_products(tfidf, model, is_final_run, workers, profile)
+            counts['rows_in'] = counts['rows_out'] = total_products
+        # Only now is every product a delta clean touched reflected in the output
+        clear_touched_products(TOUCHED_PRODUCTS_FILE)
+
         print(f"\n✅ Phase 2 Complete! Final data saved to: {FINAL_OUTPUT_FILE}")
+        metrics.finish(rows_out=total_products)
 
     except FileNotFoundError as e:
         print(f"❌ ERROR: A required file was not found. Please check paths: {e}")
         sys.exit(1)
+    finally:
+        metrics.close()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Train and run the NLP classifier.")
     parser.add_argument(
-        '--max_features', 
-        type=int, 
+        '--max_features',
+        type=int,
         default=5000,
         help='The maximum number of features for the TfidfVectorizer.'
     )
@@ -94,7 +381,47 @@ if __name__ == "__main__":
         action='store_true', # Makes this a True/False flag
         help='If set, saves the final output without the CleanedText column.'
     )
+    parser.add_argument(
+        '--predict-only',
+        action='store_true',
+        help='Skip training and categorize with saved model artifacts.'
+    )
+    parser.add_argument(
+        '--model',
+        default=None,
+        help=f"Model artifact directory for --predict-only. Defaults to the latest one in '{MODEL_DIR}'."
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of processes used to predict product batches in parallel.'
+    )
+    parser.add_argument(
+        '--params',
+        default=None,
+        help='JSON results file from the step 2.5 tuner. Its best params override --max_features.'
+    )
+    parser.add_argument(
+        '--delta',
+        action='store_true',
+        help='Re-predict only the products touched by the last step 1 --delta run with the saved model '
+             '(implies --predict-only) and merge them into the existing output.'
+    )
+    parser.add_argument(
+        '--engine',
+        choices=TRAINING_ENGINES,
+        default='tfidf',
+        help="Training engine: 'tfidf' fits TF-IDF + LogisticRegression in memory, 'hashing' streams "
+             "minibatches from disk into hashed features and an SGD model, with constant memory."
+    )
+    parser.add_argument(
+        '--compare-engines',
+        action='store_true',
+        help="With --engine hashing, also fit the in-memory TF-IDF engine on the same split and report both accuracies."
+    )
+    add_profile_argument(parser)
     args = parser.parse_args()
-    
-    main(args.max_features, args.final)
 
+    main(args.max_features, args.final, args.predict_only, args.model, args.workers, args.params, args.profile, args.delta,
+         args.engine, args.compare_engines)
@@ -0,0 +1,200 @@
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import scipy.sparse
+import sklearn
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+
+from data_io import iter_table
+from doc_store import partition_count
+
+# --- Out-of-Core Training Engine ---
+# An alternative to TF-IDF + LogisticRegression that never holds the labeled set in
+# memory. Text is hashed into a fixed number of float32 columns, so there is no
+# vocabulary to fit, and an SGD logistic-regression model is trained with partial_fit
+# on minibatches streamed from disk. Memory depends on the minibatch and shuffle-bucket
+# sizes, not on how many labeled rows there are.
+#
+# The labeled file is written category by category, so it is first spilled into
+# randomly assigned shuffle buckets; every epoch visits the buckets in a new order and
+# shuffles each one, which keeps SGD minibatches mixed. A bucket is hashed into features
+# on its first visit and the sparse matrix is saved next to it, so later epochs skip
+# tokenization. Rows whose text hashes into
+# 1 of every HOLDOUT_BUCKETS buckets form the test set (duplicate texts stay together).
+HASHING_FEATURES = 2 ** 18
+HASHING_NGRAM_RANGE = (1, 2)
+SGD_ALPHA = 1e-5
+EPOCHS = 5
+MINIBATCH_ROWS = 2000
+READ_CHUNK_ROWS = 50000
+HOLDOUT_BUCKETS = 5
+RANDOM_STATE = 42
+
+def make_hashing_vectorizer(n_features=HASHING_FEATURES, ngram_range=HASHING_NGRAM_RANGE, norm='l2'):
+    # Non-negative, L2-normalised term frequencies, comparable to the TF-IDF input.
+    # With norm=None the raw counts of several texts can be summed into one document.
+    return HashingVectorizer(n_features=n_features, ngram_range=ngram_range, stop_words='english',
+                             alternate_sign=False, norm=norm, dtype=np.float32)
+
+def is_holdout(texts):
+    """Deterministic ~1/HOLDOUT_BUCKETS test split by content hash."""
+    return pd.util.hash_pandas_object(texts, index=False).to_numpy() % HOLDOUT_BUCKETS == 0
+
+def spill_labeled_data(labeled_file, spill_dir, rng):
+    """
+    Streams the labeled file once, dropping unusable rows. Training rows are appended to
+    randomly chosen shuffle buckets and test rows to a holdout file.
+    Returns (bucket paths, holdout path, per-category training row counts, all-row counts).
+    """
+    num_buckets = partition_count(labeled_file)
+    bucket_paths = [os.path.join(spill_dir, f"train_{i:04d}.csv") for i in range(num_buckets)]
+    holdout_path = os.path.join(spill_dir, 'holdout.csv')
+    train_counts, all_counts = pd.Series(dtype='int64'), pd.Series(dtype='int64')
+    for chunk in iter_table(labeled_file, columns=['Category', 'CleanedText'], chunksize=READ_CHUNK_ROWS):
+        chunk = chunk[chunk['Category'] != 'Uncategorized'].dropna(subset=['CleanedText'])
+        holdout = is_holdout(chunk['CleanedText'])
+        chunk[holdout].to_csv(holdout_path, mode='a', header=False, index=False)
+        train = chunk[~holdout]
+        for bucket, rows in train.groupby(rng.integers(num_buckets, size=len(train))):
+            rows.to_csv(bucket_paths[bucket], mode='a', header=False, index=False)
+        train_counts = train_counts.add(train['Category'].value_counts(), fill_value=0)
+        all_counts = all_counts.add(chunk['Category'].value_counts(), fill_value=0)
+    return [path for path in bucket_paths if os.path.exists(path)], holdout_path, train_counts, all_counts
+
+def read_spill(path):
+    return pd.read_csv(path, names=['Category', 'CleanedText'], dtype=str, keep_default_na=False)
+
+def hashed_bucket(path, vectorizer, classes):
+    """(features, labels) of one training bucket, hashed on first use and cached on disk."""
+    matrix_path, labels_path = f"{path}.features.npz", f"{path}.labels.npy"
+    if os.path.exists(labels_path):
+        return scipy.sparse.load_npz(matrix_path), np.load(labels_path, allow_pickle=True)
+    train = read_spill(path)
+    train = train[train['Category'].isin(classes)]
+    features, labels = vectorizer.transform(train['CleanedText']), train['Category'].to_numpy(dtype=object)
+    scipy.sparse.save_npz(matrix_path, features, compressed=False)
+    # Written last: its presence marks the cache as complete
+    np.save(labels_path, labels)
+    return features, labels
+
+def iter_holdout(holdout_path, classes):
+    """Yields (texts, labels) minibatches of the holdout rows whose category is modelled."""
+    if not os.path.exists(holdout_path):
+        return
+    with pd.read_csv(holdout_path, names=['Category', 'CleanedText'], dtype=str, keep_default_na=False,
+                     chunksize=READ_CHUNK_ROWS) as chunks:
+        for chunk in chunks:
+            chunk = chunk[chunk['Category'].isin(classes)]
+            if len(chunk):
+                yield chunk['CleanedText'], chunk['Category']
+
+def holdout_accuracy(vectorizer, model, holdout_path, classes):
+    """Accuracy over the holdout file, streamed. Returns (accuracy, rows evaluated)."""
+    correct = total = 0
+    for texts, labels in iter_holdout(holdout_path, classes):
+        correct += int((model.predict(vectorizer.transform(texts)) == labels.to_numpy()).sum())
+        total += len(labels)
+    return (correct / total if total else 0.0), total
+
+def balanced_class_weights(train_counts, classes):
+    """The weights class_weight='balanced' would give, which partial_fit cannot compute itself."""
+    counts = train_counts.reindex(classes).fillna(0).clip(lower=1)
+    return {category: float(counts.sum() / (len(classes) * count)) for category, count in counts.items()}
+
+def fit_tfidf_on_spill(bucket_paths, classes, max_features, ngram_range, c_value):
+    """The in-memory TF-IDF + LogisticRegression engine, fitted on the same training rows."""
+    train = pd.concat([read_spill(path) for path in bucket_paths])
+    train = train[train['Category'].isin(classes)]
+    tfidf = TfidfVectorizer(stop_words='english', max_features=max_features, ngram_range=ngram_range)
+    model = LogisticRegression(C=c_value, class_weight='balanced', random_state=RANDOM_STATE, max_iter=1000)
+    model.fit(tfidf.fit_transform(train['CleanedText']), train['Category'])
+    return tfidf, model
+
+def compare_engines(bucket_paths, holdout_path, classes, tfidf_params, hashing_result, metrics):
+    """Fits the in-memory engine on the same split and prints both accuracies side by side."""
+    print(f"\nFitting the in-memory TF-IDF engine on the same split for comparison "
+          f"(max_features = {tfidf_params['max_features']}, ngram_range = {tuple(tfidf_params['ngram_range'])}, C = {tfidf_params['C']})...")
+    start = time.perf_counter()
+    with metrics.phase('compare_tfidf_fit'):
+        tfidf, model = fit_tfidf_on_spill(bucket_paths, classes, tfidf_params['max_features'],
+                                          tuple(tfidf_params['ngram_range']), tfidf_params['C'])
+    tfidf_result = {'train_seconds': round(time.perf_counter() - start, 2)}
+    tfidf_result['accuracy'], holdout_rows = holdout_accuracy(tfidf, model, holdout_path, classes)
+
+    print(f"\n--- Engine Comparison (same holdout of {holdout_rows:,} rows) ---")
+    print(f"{'Engine':<28}{'Accuracy':>10}{'Train seconds':>16}")
+    for name, result in [('tfidf (in memory)', tfidf_result), ('hashing (out of core)', hashing_result)]:
+        print(f"{name:<28}{result['accuracy']:>10.2%}{result['train_seconds']:>16.2f}")
+    return {'holdout_rows': holdout_rows, 'tfidf': {**tfidf_params, **tfidf_result}, 'hashing': hashing_result}
+
+def train_streaming_model(labeled_file, metrics, epochs=EPOCHS, compare_tfidf=None):
+    """
+    Trains the hashed-feature SGD model out of core. Returns (vectorizer, model, metadata).
+    With `compare_tfidf` ({'max_features', 'ngram_range', 'C'}), the in-memory TF-IDF engine
+    is also fitted on the same split and both accuracies are reported side by side.
+    """
+    rng = np.random.default_rng(RANDOM_STATE)
+    vectorizer = make_hashing_vectorizer()
+    spill_parent = os.path.dirname(labeled_file) or '.'
+    with tempfile.TemporaryDirectory(prefix='streaming_training_', dir=spill_parent) as work_dir:
+        print(f"Spilling labeled data from '{labeled_file}' into shuffle buckets...")
+        with metrics.phase('spill') as counts:
+            bucket_paths, holdout_path, train_counts, all_counts = spill_labeled_data(labeled_file, work_dir, rng)
+            counts['rows_in'] = counts['rows_out'] = int(all_counts.sum())
+        # Same rule as the in-memory engine: a category needs at least two rows
+        classes = np.array(sorted(all_counts[all_counts >= 2].index))
+        if train_counts.reindex(classes).fillna(0).sum() < 50:
+            raise ValueError(f"Not enough data ({int(train_counts.sum())} training rows) for training.")
+        print(f"{int(train_counts.sum()):,} training rows in {len(bucket_paths)} bucket(s), {len(classes)} categories.")
+
+        model = SGDClassifier(loss='log_loss', alpha=SGD_ALPHA, average=True, random_state=RANDOM_STATE,
+                              class_weight=balanced_class_weights(train_counts, classes))
+        train_seconds = 0.0
+        for epoch in range(epochs):
+            start = time.perf_counter()
+            rows = 0
+            with metrics.phase(f"epoch_{epoch + 1}") as counts:
+                for bucket in rng.permutation(len(bucket_paths)):
+                    features, labels = hashed_bucket(bucket_paths[bucket], vectorizer, classes)
+                    order = rng.permutation(len(labels))
+                    features, labels = features[order], labels[order]
+                    for offset in range(0, len(labels), MINIBATCH_ROWS):
+                        model.partial_fit(features[offset:offset + MINIBATCH_ROWS], labels[offset:offset + MINIBATCH_ROWS], classes=classes)
+                    rows += len(labels)
+                counts['rows_in'] = counts['rows_out'] = rows
+            seconds = time.perf_counter() - start
+            train_seconds += seconds
+            print(f"  Epoch {epoch + 1}/{epochs}: {rows:,} rows in {seconds:.1f}s")
+
+        print("\n--- Model Performance Evaluation ---")
+        with metrics.phase('evaluate') as counts:
+            accuracy, holdout_rows = holdout_accuracy(vectorizer, model, holdout_path, classes)
+            counts['rows_in'] = holdout_rows
+        print(f"✅ Model Accuracy on Holdout Set ({holdout_rows:,} rows): {accuracy:.2%}")
+        comparison = None
+        if compare_tfidf is not None:
+            comparison = compare_engines(bucket_paths, holdout_path, classes, compare_tfidf,
+                                         {'accuracy': accuracy, 'train_seconds': round(train_seconds, 2)}, metrics)
+
+    metadata = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'engine': 'hashing',
+        'max_features': HASHING_FEATURES,
+        'ngram_range': list(HASHING_NGRAM_RANGE),
+        'alpha': SGD_ALPHA,
+        'epochs': epochs,
+        'classes': model.classes_.tolist(),
+        'training_data_file': labeled_file,
+        'training_rows': int(train_counts.reindex(classes).fillna(0).sum()),
+        'holdout_rows': holdout_rows,
+        'accuracy': accuracy,
+        'sklearn_version': sklearn.__version__,
+    }
+    if comparison is not None:
+        metadata['engine_comparison'] = comparison
+    return vectorizer, model, metadata
@@ -0,0 +1,106 @@
+import argparse
+import random
+import re
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from data_io import read_table
+
+# --- Configuration ---
+# Serves fake Amazon product pages so the step 2 scraper can be exercised offline:
+#   python3 stub_product_server.py --port 8000
+#   python3 step_2_webscraping_labelled_training_data.py --fetcher http --workers 8 --rate 50 --base-url http://127.0.0.1:8000
+DEFAULT_PORT = 8000
+STUB_BREADCRUMBS = [
+    "Grocery & Gourmet Food › Snack Foods › Chips & Crisps",
+    "Pet Supplies › Dogs › Food › Dry",
+    "Beauty & Personal Care › Skin Care › Body › Lotions",
+    "Health & Household › Vitamins & Dietary Supplements",
+    "Toys & Games › Puzzles › Jigsaw Puzzles",
+    "Sports & Outdoors › Outdoor Recreation › Camping & Hiking",
+    "Books › Cookbooks, Food & Wine",
+]
+PRODUCT_PATH = re.compile(r'^/dp/([A-Za-z0-9]+)/?$')
+# With --labels, ProductId -> Category from a labeled file, so scraped labels match the review text
+LABELED_BREADCRUMBS = {}
+UNLABELED_BREADCRUMB = "Everything Else"
+
+def load_labeled_breadcrumbs(labels_file):
+    df_labels = read_table(labels_file, columns=['ProductId', 'Category'])
+    categories = df_labels['Category'].astype(str).replace('Uncategorized', UNLABELED_BREADCRUMB)
+    return dict(zip(df_labels['ProductId'].astype(str), categories))
+
+def breadcrumb_for(product_id):
+    """Deterministic breadcrumb per ProductId, so repeated runs agree."""
+    if LABELED_BREADCRUMBS:
+        return LABELED_BREADCRUMBS.get(product_id, UNLABELED_BREADCRUMB)
+    return STUB_BREADCRUMBS[zlib.crc32(product_id.encode()) % len(STUB_BREADCRUMBS)]
+
+def render_product_page(product_id):
+    crumbs = ''.join(
+        f'<li><span class="a-list-item"><a class="a-link-normal" href="#">{crumb}</a></span></li>'
+        for crumb in breadcrumb_for(product_id).split(' › ')
+    )
+    return (
+        f"<html><head><title>Stub product {product_id}</title></head><body>"
+        f'<div id="nav-main">Navigation</div>'
+        f'<div id="wayfinding-breadcrumbs_feature_div" class="a-section">'
+        f'<ul class="a-unordered-list a-horizontal">{crumbs}</ul></div>'
+        f'<div id="dp-container"><h1 id="title">Stub product {product_id}</h1>'
+        f"<p>{'Lorem ipsum dolor sit amet. ' * 200}</p></div>"
+        f"</body></html>"
+    )
+
+class StubProductHandler(BaseHTTPRequestHandler):
+    latency_seconds = 0.0
+    failure_rate = 0.0
+
+    def do_GET(self):
+        match = PRODUCT_PATH.match(self.path)
+        if not match:
+            self.send_error(404)
+            return
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        if random.random() < self.failure_rate:
+            self.send_error(503)
+            return
+        body = render_product_page(match.group(1)).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def main(port, latency_seconds, failure_rate, labels_file=None):
+    if labels_file:
+        LABELED_BREADCRUMBS.update(load_labeled_breadcrumbs(labels_file))
+        print(f"Serving the categories of {len(LABELED_BREADCRUMBS):,} products from '{labels_file}'.")
+    StubProductHandler.latency_seconds = latency_seconds
+    StubProductHandler.failure_rate = failure_rate
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubProductHandler)
+    print(f"Stub product server listening on http://127.0.0.1:{port}/dp/<ProductId>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve fake /dp/<id> product pages for offline scraper testing.")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before each response.')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of requests answered with HTTP 503.')
+    parser.add_argument(
+        '--labels',
+        default=None,
+        help='Labeled category file (e.g. from generate_synthetic_data.py) whose categories the pages show.'
+    )
+    args = parser.parse_args()
+
+    main(args.port, args.latency, args.failure_rate, args.labels)